@@ -0,0 +1,140 @@
+from datetime import datetime
+import numpy as np
+from .database import get_database
+from .cache import get_cache, get_local_version
+
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+ROLLING_WINDOW = 7
+
+class PurchaseColumns:
+    """A date range of purchases as parallel arrays; person codes index into `people`"""
+    __slots__ = ("start", "days", "day", "person", "people", "quantity", "price", "cost")
+
+    def __init__(self, start: datetime, days: int, day, person, people: list, quantity, price, cost):
+        self.start = start
+        self.days = days
+        self.day = day
+        self.person = person
+        self.people = people
+        self.quantity = quantity
+        self.price = price
+        self.cost = cost
+
+async def load_purchase_columns(start_date: datetime, end_date: datetime, people: list = None):
+    """Reads [start_date, end_date) straight into columns; pass `people` to share person codes across ranges"""
+    database = get_database()
+    codes = {name: code for code, name in enumerate(people or [])}
+    people = list(people or [])
+    day, person, quantity, price, cost = [], [], [], [], []
+    cursor = database.purchases.find(
+        {"date": {"$gte": start_date, "$lt": end_date}, "person": {"$exists": True}},
+        {"_id": 0, "date": 1, "person": 1, "quantity": 1, "price_per_liter": 1, "total_cost": 1}
+    ).batch_size(5000)
+    async for purchase in cursor:
+        name = purchase["person"]
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(people)
+            people.append(name)
+        day.append((purchase["date"] - start_date).days)
+        person.append(code)
+        quantity.append(purchase["quantity"])
+        price.append(purchase["price_per_liter"])
+        cost.append(purchase["total_cost"])
+    return PurchaseColumns(
+        start_date,
+        (end_date - start_date).days,
+        np.array(day, dtype=np.int32),
+        np.array(person, dtype=np.int32),
+        people,
+        np.array(quantity, dtype=np.float64),
+        np.array(price, dtype=np.float64),
+        np.array(cost, dtype=np.float64)
+    )
+
+def rolling_mean(values, window: int):
+    # Trailing mean over `window` days; the first days average over what exists so far
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+def compute_yearly_report(year: int, current, previous, today: datetime = None):
+    today = today or datetime.now()
+    people_count = len(current.people)
+
+    quantity_by_person = np.bincount(current.person, weights=current.quantity, minlength=people_count)
+    cost_by_person = np.bincount(current.person, weights=current.cost, minlength=people_count)
+    count_by_person = np.bincount(current.person, minlength=people_count)
+    # Rate weighted by litres bought, so a 2L purchase counts twice as much as a 1L one
+    weighted_rate = np.bincount(current.person, weights=current.price * current.quantity, minlength=people_count)
+    previous_cost = np.bincount(previous.person, weights=previous.cost, minlength=people_count)[:people_count]
+    previous_quantity = np.bincount(previous.person, weights=previous.quantity, minlength=people_count)[:people_count]
+
+    # Only days that have happened count towards averages
+    elapsed = current.days
+    if current.start.year == today.year:
+        elapsed = min(current.days, (today - current.start).days + 1)
+    daily_quantity = np.bincount(current.day, weights=current.quantity, minlength=current.days)[:elapsed]
+    daily_cost = np.bincount(current.day, weights=current.cost, minlength=current.days)[:elapsed]
+    weekdays = (np.arange(elapsed) + current.start.weekday()) % 7
+    weekday_counts = np.bincount(weekdays, minlength=7)
+    weekday_quantity = np.bincount(weekdays, weights=daily_quantity, minlength=7) / np.maximum(weekday_counts, 1)
+    weekday_cost = np.bincount(weekdays, weights=daily_cost, minlength=7) / np.maximum(weekday_counts, 1)
+
+    month_starts = np.array([(datetime(year, month, 1) - current.start).days for month in range(1, 13)])
+    month_of_day = np.searchsorted(month_starts, current.day, side="right") - 1
+    monthly_quantity = np.bincount(month_of_day, weights=current.quantity, minlength=12)
+    monthly_cost = np.bincount(month_of_day, weights=current.cost, minlength=12)
+
+    total_quantity = float(current.quantity.sum())
+    people = []
+    for code in np.argsort(-cost_by_person, kind="stable"):
+        last_cost = float(previous_cost[code])
+        people.append({
+            "person": current.people[code],
+            "quantity": float(quantity_by_person[code]),
+            "total_cost": float(cost_by_person[code]),
+            "purchase_count": int(count_by_person[code]),
+            "average_rate": float(weighted_rate[code] / quantity_by_person[code]) if quantity_by_person[code] else 0.0,
+            "previous_quantity": float(previous_quantity[code]),
+            "previous_cost": last_cost,
+            "cost_change": (float(cost_by_person[code]) - last_cost) / last_cost * 100 if last_cost else None
+        })
+
+    previous_total = float(previous.cost.sum())
+    total_cost = float(current.cost.sum())
+    return {
+        "year": year,
+        "total_quantity": total_quantity,
+        "total_cost": total_cost,
+        "purchase_count": int(len(current.day)),
+        "average_rate": float((current.price * current.quantity).sum() / total_quantity) if total_quantity else 0.0,
+        "average_daily_quantity": float(daily_quantity.mean()) if elapsed else 0.0,
+        "previous_total_cost": previous_total,
+        "cost_change": (total_cost - previous_total) / previous_total * 100 if previous_total else None,
+        "people": people,
+        "months": [
+            {"month": month + 1, "quantity": float(monthly_quantity[month]), "total_cost": float(monthly_cost[month])}
+            for month in range(12)
+        ],
+        "weekdays": [
+            {"weekday": WEEKDAY_NAMES[weekday], "quantity": float(weekday_quantity[weekday]), "total_cost": float(weekday_cost[weekday])}
+            for weekday in range(7)
+        ],
+        "rolling_quantity": [round(float(value), 3) for value in rolling_mean(daily_quantity, ROLLING_WINDOW)]
+    }
+
+async def get_yearly_report(year: int):
+    # Any purchase write bumps the global purchases version, so cached reports never go stale
+    cache = get_cache("analytics")
+    cache_key = (year, get_local_version("purchases"))
+    report = cache.get(cache_key)
+    if report is not None:
+        return report
+
+    current = await load_purchase_columns(datetime(year, 1, 1), datetime(year + 1, 1, 1))
+    previous = await load_purchase_columns(datetime(year - 1, 1, 1), datetime(year, 1, 1), current.people)
+    report = compute_yearly_report(year, current, previous)
+    cache.set(cache_key, report)
+    return report
@@ -1,20 +1,86 @@
-from functools import lru_cache
-from datetime import datetime, timedelta
+import os
+import time
+from collections import OrderedDict
 
-# Simple in-memory cache for milk rate
-_milk_rate_cache = {"value": None, "timestamp": None}
+# Default lifetime for cached entries
 CACHE_TTL = 300  # 5 minutes
+# How often each worker re-reads the shared data versions from MongoDB
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "1"))
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ttl seconds"""
+    
+    def __init__(self, maxsize: int = 128, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+    
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def evict(self, predicate):
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+    
+    def clear(self):
+        self._entries.clear()
+
+# Namespaced caches; each is dropped when its "cache:<namespace>" version changes
+_caches = {
+    "milk_rate": TTLCache(maxsize=1),
+    "available_months": TTLCache(maxsize=1),
+    "summary": TTLCache(maxsize=64),
+    "pdf": TTLCache(maxsize=32, ttl=3600),
+    "fragments": TTLCache(maxsize=256, ttl=3600),
+    "analytics": TTLCache(maxsize=8)
+}
+
+# Last seen copy of the shared data_versions collection
+_versions = {}
+
+def get_cache(namespace: str):
+    return _caches[namespace]
+
+def get_local_version(key: str):
+    return _versions.get(key, 0)
+
+def apply_versions(versions: dict):
+    for key, version in versions.items():
+        if _versions.get(key) == version:
+            continue
+        _versions[key] = version
+        if key.startswith("cache:") and key[6:] in _caches:
+            _caches[key[6:]].clear()
+        elif key.startswith("purchases:"):
+            year, month = map(int, key[10:].split("-"))
+            clear_pdf_cache(year, month)
 
 def get_cached_milk_rate():
-    if _milk_rate_cache["value"] is not None:
-        if _milk_rate_cache["timestamp"] and (datetime.now() - _milk_rate_cache["timestamp"]).seconds < CACHE_TTL:
-            return _milk_rate_cache["value"]
-    return None
+    return _caches["milk_rate"].get("rate")
 
 def set_cached_milk_rate(rate: float):
-    _milk_rate_cache["value"] = rate
-    _milk_rate_cache["timestamp"] = datetime.now()
+    _caches["milk_rate"].set("rate", rate)
+
+# Rendered monthly PDFs keyed by (year, month, data version)
+def get_cached_pdf(key: tuple):
+    return _caches["pdf"].get(key)
+
+def set_cached_pdf(key: tuple, pdf_bytes: bytes):
+    _caches["pdf"].set(key, pdf_bytes)
 
-def clear_milk_rate_cache():
-    _milk_rate_cache["value"] = None
-    _milk_rate_cache["timestamp"] = None
+def clear_pdf_cache(year: int, month: int):
+    _caches["pdf"].evict(lambda key: key[:2] == (year, month))
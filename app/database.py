@@ -1,10 +1,24 @@
+import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from typing import List
 from datetime import datetime, timedelta
-from .models import Person, PurchaseCreate, Settings, Purchase
+from .models import Person, PurchaseCreate, Settings, Purchase, PurchaseRow, StandingOrder
+from .directory import people_directory
+from .metrics import mongo_event_listeners
+from .profiler import slow_query_listeners
 from bson import ObjectId
-from .cache import get_cached_milk_rate, set_cached_milk_rate, clear_milk_rate_cache
+from bson.errors import InvalidId
+from .cache import (
+    get_cache, get_local_version, apply_versions, get_cached_milk_rate, set_cached_milk_rate,
+    CACHE_SYNC_INTERVAL
+)
+
+# Version 2 stores one document per person instead of a `people` array
+PURCHASE_SCHEMA_VERSION = 2
+PURCHASE_PROJECTION = {"date": 1, "person": 1, "quantity": 1, "price_per_liter": 1, "total_cost": 1}
 
 class Database:
     client: AsyncIOMotorClient = None
@@ -17,7 +31,8 @@ async def connect_to_mongo():
         maxPoolSize=10,
         minPoolSize=1,
         maxIdleTimeMS=45000,
-        serverSelectionTimeoutMS=5000
+        serverSelectionTimeoutMS=5000,
+        event_listeners=mongo_event_listeners() + slow_query_listeners()
     )
     
 async def close_mongo_connection():
@@ -26,17 +41,260 @@ async def close_mongo_connection():
 def get_database():
     return db.client[os.getenv("DATABASE_NAME")]
 
+async def bump_version(key: str):
+    database = get_database()
+    version = await database.data_versions.find_one_and_update(
+        {"_id": key},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # Apply locally right away; other workers pick it up on their next sync
+    apply_versions({key: version["version"]})
+    return version["version"]
+
+async def invalidate_cache(namespace: str):
+    await bump_version(f"cache:{namespace}")
+
+async def refresh_data_versions():
+    database = get_database()
+    apply_versions({version["_id"]: version["version"] async for version in database.data_versions.find()})
+
+async def watch_data_versions(interval: float = CACHE_SYNC_INTERVAL):
+    while True:
+        try:
+            await refresh_data_versions()
+        except Exception as e:
+            print(f"Failed to refresh cache versions: {str(e)}")
+        await asyncio.sleep(interval)
+
+# Offline clients replay the change log; entries older than this are dropped and those clients resync
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", "30"))
+# Entries this old are collapsed to the latest one per record
+CHANGE_LOG_COMPACT_AFTER = timedelta(hours=1)
+# A sequence number still missing after this long belongs to a writer that failed before inserting
+CHANGE_LOG_GAP_GRACE = timedelta(seconds=10)
+
+# Synced records carry `rev`, bumped by the same update that writes them, and the log stores the state that
+# update produced. Concurrent writes can reserve sequence numbers in the opposite order to how they were
+# applied, so clients keep the highest rev per key (deleted keys included) and ignore older entries.
+def purchase_change(purchase: dict):
+    return ("purchase", "upsert", str(purchase["_id"]), {
+        "id": str(purchase["_id"]),
+        "date": purchase["date"],
+        "person": purchase["person"],
+        "quantity": purchase["quantity"],
+        "price_per_liter": purchase["price_per_liter"],
+        "total_cost": purchase["total_cost"],
+        "rev": purchase.get("rev", 0)
+    })
+
+def person_change(person: dict):
+    return ("person", "upsert", str(person["_id"]), {
+        "id": str(person["_id"]), "name": person["name"], "email": person.get("email"), "rev": person.get("rev", 0)
+    })
+
+def payment_change(status: dict):
+    person, year, month = status["person"], status["year"], status["month"]
+    return ("payment", "upsert", f"{person}:{year}-{month:02d}", {
+        "person": person, "year": year, "month": month, "paid": bool(status.get("paid")), "rev": status.get("rev", 0)
+    })
+
+def settings_change(settings: dict):
+    return ("settings", "upsert", "milk_rate", {"milk_rate": settings.get("milk_rate", 60.0), "rev": settings.get("rev", 0)})
+
+def deletion_change(entity: str, key: str, deleted: dict):
+    # One past the last stored state; on an equal rev the delete wins
+    return (entity, "delete", key, {"rev": deleted.get("rev", 0) + 1})
+
+async def record_changes(changes: list):
+    """Append (entity, op, key, doc) tuples to the change log under consecutive sequence numbers"""
+    if not changes:
+        return
+    database = get_database()
+    # One counter round trip reserves a block for the whole batch
+    counter = await database.counters.find_one_and_update(
+        {"_id": "change_log"},
+        {"$inc": {"seq": len(changes)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    first = counter["seq"] - len(changes) + 1
+    now = datetime.utcnow()
+    await database.change_log.insert_many([
+        {"_id": first + index, "entity": entity, "op": op, "key": key, "doc": doc, "rev": doc["rev"], "at": now}
+        for index, (entity, op, key, doc) in enumerate(changes)
+    ])
+
+async def get_change_log_state():
+    counter = await get_database().counters.find_one({"_id": "change_log"})
+    return (counter.get("seq", 0), counter.get("floor", 0)) if counter else (0, 0)
+
+async def get_changes_since(since: int, limit: int = 500):
+    """Changes after `since` in order, or None when compaction already dropped some of them"""
+    _, floor = await get_change_log_state()
+    if since < floor:
+        return None
+
+    database = get_database()
+    entries = await database.change_log.find({"_id": {"$gt": since}}).sort("_id", 1).limit(limit + 1).to_list(None)
+    changes = []
+    last_seq = since
+    more = len(entries) > limit
+    settled = datetime.utcnow() - CHANGE_LOG_GAP_GRACE
+    for entry in entries[:limit]:
+        # Sequence numbers are reserved before the insert, so a hole followed by a fresh entry may still
+        # fill in; stop there rather than let the client skip it. Older holes were compacted or abandoned.
+        if entry["_id"] != last_seq + 1 and entry["at"] > settled:
+            more = True
+            break
+        changes.append({
+            "seq": entry["_id"], "entity": entry["entity"], "op": entry["op"], "key": entry["key"], "doc": entry["doc"]
+        })
+        last_seq = entry["_id"]
+    return {"changes": changes, "next": last_seq, "more": more}
+
+# Snapshot pages walk these collections in order, each by _id
+SNAPSHOT_SOURCES = {
+    "people": ({}, None, person_change),
+    "payment_status": ({}, None, payment_change),
+    "purchases": ({"person": {"$exists": True}}, {**PURCHASE_PROJECTION, "rev": 1}, purchase_change)
+}
+
+def encode_snapshot_cursor(seq: int, collection: str, last_id):
+    return f"{seq}.{collection}.{last_id or ''}"
+
+def decode_snapshot_cursor(value: str):
+    seq, collection, last_id = value.split(".")
+    if collection not in SNAPSHOT_SOURCES:
+        raise ValueError(f"unknown snapshot collection '{collection}'")
+    try:
+        last_id = ObjectId(last_id) if last_id else None
+    except InvalidId as e:
+        raise ValueError(str(e))
+    return int(seq), collection, last_id
+
+async def get_sync_snapshot(cursor: str = None, limit: int = 500):
+    """One page of a full replica, as upserts, for new clients and those behind the compaction floor"""
+    database = get_database()
+    changes = []
+    if cursor:
+        seq, collection, last_id = decode_snapshot_cursor(cursor)
+    else:
+        # Pin the sequence before reading: writes racing the snapshot are replayed by the deltas after it,
+        # and replays are idempotent
+        seq, _ = await get_change_log_state()
+        collection, last_id = next(iter(SNAPSHOT_SOURCES)), None
+        changes.append(settings_change(await database.settings.find_one() or {}))
+    
+    collections = list(SNAPSHOT_SOURCES)
+    next_cursor = None
+    while True:
+        wanted = limit - len(changes)
+        if wanted <= 0:
+            # The page filled up before this collection; resume at its current position
+            next_cursor = encode_snapshot_cursor(seq, collection, last_id)
+            break
+        query, projection, to_change = SNAPSHOT_SOURCES[collection]
+        if last_id is not None:
+            query = {**query, "_id": {"$gt": last_id}}
+        documents = await database[collection].find(query, projection).sort("_id", 1).limit(wanted).to_list(None)
+        changes += [to_change(document) for document in documents]
+        if len(documents) == wanted:
+            next_cursor = encode_snapshot_cursor(seq, collection, documents[-1]["_id"])
+            break
+        position = collections.index(collection) + 1
+        if position == len(collections):
+            break
+        collection, last_id = collections[position], None
+    return {
+        "changes": [{"entity": entity, "op": op, "key": key, "doc": doc} for entity, op, key, doc in changes],
+        "next": seq,
+        "snapshot": next_cursor
+    }
+
+async def compact_change_log():
+    database = get_database()
+    now = datetime.utcnow()
+
+    # Only the newest entry per record matters to a client that has not seen any of them
+    groups = database.change_log.aggregate([
+        {"$match": {"at": {"$lt": now - CHANGE_LOG_COMPACT_AFTER}}},
+        {"$group": {"_id": {"entity": "$entity", "key": "$key"}, "entries": {"$push": {"seq": "$_id", "rev": "$rev"}}}},
+        {"$match": {"entries.1": {"$exists": True}}}
+    ])
+    superseded = []
+    async for group in groups:
+        # Newest by rev, not by sequence number, which concurrent writers may have taken out of order
+        latest = max(group["entries"], key=lambda entry: (entry.get("rev") or 0, entry["seq"]))
+        superseded.extend(entry["seq"] for entry in group["entries"] if entry is not latest)
+    for start in range(0, len(superseded), 1000):
+        await database.change_log.delete_many({"_id": {"$in": superseded[start:start + 1000]}})
+
+    # Past retention even the newest entries go; raise the floor first so clients behind it resync
+    expired = await database.change_log.find_one(
+        {"at": {"$lt": now - timedelta(days=CHANGE_LOG_RETENTION_DAYS)}},
+        {"_id": 1},
+        sort=[("_id", -1)]
+    )
+    dropped = 0
+    if expired:
+        await database.counters.update_one({"_id": "change_log"}, {"$max": {"floor": expired["_id"]}}, upsert=True)
+        dropped = (await database.change_log.delete_many({"_id": {"$lte": expired["_id"]}})).deleted_count
+    print(f"Change log compacted: {len(superseded)} superseded, {dropped} expired")
+    return len(superseded) + dropped
+
+async def _load_people_directory():
+    version = get_local_version("cache:people")
+    if not people_directory.is_current(version):
+        database = get_database()
+        people = [Person(**person) async for person in database.people.find()]
+        people_directory.load(people, version)
+    return people_directory
+
 async def create_person(person: Person):
     database = get_database()
-    result = await database.people.insert_one(person.model_dump(by_alias=True, exclude_unset=True))
+    await _load_people_directory()
+    document = {**person.model_dump(by_alias=True, exclude_unset=True), "rev": 1}
+    result = await database.people.insert_one(document)
+    version = await bump_version("cache:people")
+    people_directory.apply(version, lambda: people_directory.add(person.model_copy(update={"id": result.inserted_id})))
+    await record_changes([person_change({**document, "_id": result.inserted_id})])
     return str(result.inserted_id)
 
-async def get_people():
+async def update_person(person_id: str, name: str, email: str = None):
     database = get_database()
-    people = []
-    async for person in database.people.find():
-        people.append(Person(**person))
-    return people
+    await _load_people_directory()
+    updated = await database.people.find_one_and_update(
+        {"_id": ObjectId(person_id)},
+        {"$set": {"name": name, "email": email}, "$inc": {"rev": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    version = await bump_version("cache:people")
+    people_directory.apply(version, lambda: people_directory.update(person_id, name, email))
+    if updated:
+        await record_changes([person_change(updated)])
+
+async def delete_person(person_id: str):
+    database = get_database()
+    await _load_people_directory()
+    deleted = await database.people.find_one_and_delete({"_id": ObjectId(person_id)})
+    version = await bump_version("cache:people")
+    people_directory.apply(version, lambda: people_directory.remove(person_id))
+    if deleted:
+        await record_changes([deletion_change("person", person_id, deleted)])
+
+async def get_people():
+    directory = await _load_people_directory()
+    return directory.all()
+
+async def get_person_by_id(person_id: str):
+    directory = await _load_people_directory()
+    return directory.by_id(person_id)
+
+async def get_person_by_name(name: str):
+    directory = await _load_people_directory()
+    return directory.by_name(name)
 
 async def get_milk_rate():
     cached = get_cached_milk_rate()
@@ -51,12 +309,90 @@ async def get_milk_rate():
 
 async def update_milk_rate(rate: float):
     database = get_database()
-    await database.settings.update_one(
+    settings = await database.settings.find_one_and_update(
         {},
-        {"$set": {"milk_rate": rate}},
-        upsert=True
+        {"$set": {"milk_rate": rate}, "$inc": {"rev": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
-    clear_milk_rate_cache()
+    await invalidate_cache("milk_rate")
+    await record_changes([settings_change(settings)])
+
+def _month_range(year: int, month: int):
+    start_date = datetime(year, month, 1)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1)
+    else:
+        end_date = datetime(year, month + 1, 1)
+    return start_date, end_date
+
+def _rollup_entries(purchase: dict):
+    # Old schema stored one document for several people
+    if 'person' not in purchase and 'people' in purchase:
+        cost = purchase.get('cost_per_person', purchase['total_cost'])
+        return [(person, purchase['quantity'], cost) for person in purchase['people']]
+    return [(purchase['person'], purchase['quantity'], purchase['total_cost'])]
+
+async def _apply_purchase_deltas(purchases: list, sign: int):
+    if not purchases:
+        return
+    database = get_database()
+    
+    # Sum the deltas first so each rollup and month is written once
+    rollups = {}
+    months = {}
+    for purchase in purchases:
+        date = purchase['date']
+        for person, quantity, cost in _rollup_entries(purchase):
+            delta = rollups.setdefault((date.year, date.month, date.day, person), [0, 0, 0])
+            delta[0] += quantity
+            delta[1] += cost
+            delta[2] += 1
+            months[(date.year, date.month)] = months.get((date.year, date.month), 0) + 1
+    
+    rollup_keys = [
+        {"year": year, "month": month, "day": day, "person": person}
+        for year, month, day, person in rollups
+    ]
+    await database.purchase_rollups.bulk_write([
+        UpdateOne(
+            key,
+            {"$inc": {"quantity": sign * quantity, "total_cost": sign * cost, "count": sign * count}},
+            upsert=True
+        )
+        for key, (quantity, cost, count) in zip(rollup_keys, rollups.values())
+    ], ordered=False)
+    
+    # Month catalogue backing the month picker
+    month_keys = [f"{year}-{month:02d}" for year, month in months]
+    result = await database.purchase_months.bulk_write([
+        UpdateOne(
+            {"_id": month_key},
+            {"$inc": {"count": sign * count}, "$set": {"year": year, "month": month}},
+            upsert=True
+        )
+        for month_key, ((year, month), count) in zip(month_keys, months.items())
+    ], ordered=False)
+    months_changed = result.upserted_count > 0
+    
+    if sign < 0:
+        await database.purchase_rollups.delete_many({"$or": rollup_keys, "count": {"$lte": 0}})
+        removed = await database.purchase_months.delete_many({"_id": {"$in": month_keys}, "count": {"$lte": 0}})
+        months_changed = removed.deleted_count > 0
+    
+    for month_key in month_keys:
+        await bump_version(f"purchases:{month_key}")
+    await bump_version("purchases")
+    if months_changed:
+        await invalidate_cache("available_months")
+
+async def _apply_purchase_delta(purchase: dict, sign: int):
+    await _apply_purchase_deltas([purchase], sign)
+
+async def get_month_version(year: int, month: int):
+    database = get_database()
+    version = await database.data_versions.find_one({"_id": f"purchases:{year}-{month:02d}"})
+    return version["version"] if version else 0
 
 async def create_purchase(purchase_data: PurchaseCreate):
     # Get global milk rate if not provided
@@ -71,13 +407,54 @@ async def create_purchase(purchase_data: PurchaseCreate):
         "person": purchase_data.person,
         "quantity": purchase_data.quantity,
         "price_per_liter": price_per_liter,
-        "total_cost": total_cost
+        "total_cost": total_cost,
+        "schema_version": PURCHASE_SCHEMA_VERSION,
+        "rev": 1
     }
     
     database = get_database()
     result = await database.purchases.insert_one(purchase)
+    await _apply_purchase_delta(purchase, 1)
+    await record_changes([purchase_change(purchase)])
     return str(result.inserted_id)
 
+async def create_purchases(purchases: List[PurchaseCreate]):
+    # One rate lookup and one unordered insert for the whole batch
+    milk_rate = await get_milk_rate()
+    now = datetime.now()
+    documents = []
+    for purchase_data in purchases:
+        price_per_liter = purchase_data.price_per_liter
+        if price_per_liter is None:
+            price_per_liter = milk_rate
+        documents.append({
+            "_id": ObjectId(),
+            "date": purchase_data.date or now,
+            "person": purchase_data.person,
+            "quantity": purchase_data.quantity,
+            "price_per_liter": price_per_liter,
+            "total_cost": purchase_data.quantity * price_per_liter,
+            "schema_version": PURCHASE_SCHEMA_VERSION,
+            "rev": 1
+        })
+    if not documents:
+        return []
+    
+    database = get_database()
+    errors = {}
+    try:
+        await database.purchases.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = {error["index"]: error["errmsg"] for error in e.details.get("writeErrors", [])}
+    
+    inserted = [d for i, d in enumerate(documents) if i not in errors]
+    await _apply_purchase_deltas(inserted, 1)
+    await record_changes([purchase_change(d) for d in inserted])
+    return [
+        {"id": None, "error": errors[i]} if i in errors else {"id": str(document["_id"]), "error": None}
+        for i, document in enumerate(documents)
+    ]
+
 async def update_purchase(purchase_id: str, purchase_data: PurchaseCreate):
     price_per_liter = purchase_data.price_per_liter
     if price_per_liter is None:
@@ -89,128 +466,449 @@ async def update_purchase(purchase_id: str, purchase_data: PurchaseCreate):
         "person": purchase_data.person,
         "quantity": purchase_data.quantity,
         "price_per_liter": price_per_liter,
-        "total_cost": total_cost
+        "total_cost": total_cost,
+        "schema_version": PURCHASE_SCHEMA_VERSION
     }
     
     if purchase_data.date:
         update_data["date"] = purchase_data.date
     
     database = get_database()
-    result = await database.purchases.update_one(
+    previous = await database.purchases.find_one_and_update(
         {"_id": ObjectId(purchase_id)},
-        {"$set": update_data}
+        # An edited delivery is the user's own purchase now, no longer tied to its standing order's (person, date) slot
+        {"$set": update_data, "$unset": {"standing_order_id": ""}, "$inc": {"rev": 1}},
+        return_document=ReturnDocument.BEFORE
     )
-    return result.modified_count > 0
+    if not previous:
+        return False
+    
+    await _apply_purchase_delta(previous, -1)
+    await _apply_purchase_delta({**previous, **update_data}, 1)
+    # The update is atomic, so the prior state plus this update is exactly what it stored
+    await record_changes([purchase_change({**previous, **update_data, "rev": previous.get("rev", 0) + 1})])
+    return True
 
 async def delete_purchase(purchase_id: str):
     database = get_database()
-    result = await database.purchases.delete_one({"_id": ObjectId(purchase_id)})
-    return result.deleted_count > 0
+    deleted = await database.purchases.find_one_and_delete({"_id": ObjectId(purchase_id)})
+    if not deleted:
+        return False
+    
+    await _apply_purchase_delta(deleted, -1)
+    await record_changes([deletion_change("purchase", purchase_id, deleted)])
+    return True
 
-async def get_available_months():
+async def get_daily_rollup(date: datetime):
+    database = get_database()
+    summary = {"total_quantity": 0, "total_cost": 0, "purchase_count": 0}
+    async for rollup in database.purchase_rollups.find({
+        "year": date.year, "month": date.month, "day": date.day
+    }):
+        summary["total_quantity"] += rollup["quantity"]
+        summary["total_cost"] += rollup["total_cost"]
+        summary["purchase_count"] += rollup["count"]
+    return summary
+
+async def get_monthly_rollup(year: int, month: int):
+    database = get_database()
+    summary = {
+        "total_quantity": 0,
+        "total_cost": 0,
+        "purchase_count": 0,
+        "person_costs": {},
+        "person_quantities": {},
+        "person_counts": {},
+        "daily": {}
+    }
+    async for rollup in database.purchase_rollups.find(
+        {"year": year, "month": month}
+    ).sort([("day", 1), ("person", 1)]):
+        person = rollup["person"]
+        summary["total_quantity"] += rollup["quantity"]
+        summary["total_cost"] += rollup["total_cost"]
+        summary["purchase_count"] += rollup["count"]
+        summary["person_costs"][person] = summary["person_costs"].get(person, 0) + rollup["total_cost"]
+        summary["person_quantities"][person] = summary["person_quantities"].get(person, 0) + rollup["quantity"]
+        summary["person_counts"][person] = summary["person_counts"].get(person, 0) + rollup["count"]
+        summary["daily"].setdefault(rollup["day"], {})[person] = {
+            "quantity": rollup["quantity"],
+            "cost": rollup["total_cost"]
+        }
+    return summary
+
+async def get_monthly_summary(year: int, month: int):
+    # Keyed by the locally synced data versions, so no extra round trip on a hit
+    cache = get_cache("summary")
+    cache_key = (
+        year,
+        month,
+        get_local_version(f"purchases:{year}-{month:02d}"),
+        get_local_version(f"payments:{year}-{month:02d}")
+    )
+    summary = cache.get(cache_key)
+    if summary is not None:
+        return summary
+    
+    database = get_database()
+    start_date, end_date = _month_range(year, month)
+    pipeline = [
+        {"$match": {"date": {"$gte": start_date, "$lt": end_date}}},
+        # Sorted before any reshaping so the date index serves it; $unwind keeps the order
+        {"$sort": {"date": -1}},
+        # Old schema stored one document for several people
+        {"$addFields": {
+            "person": {"$ifNull": ["$person", "$people"]},
+            "total_cost": {"$ifNull": ["$cost_per_person", "$total_cost"]}
+        }},
+        {"$unwind": "$person"},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_quantity": {"$sum": "$quantity"},
+                    "total_cost": {"$sum": "$total_cost"},
+                    "purchase_count": {"$sum": 1}
+                }}
+            ],
+            "people": [
+                {"$group": {
+                    "_id": "$person",
+                    "quantity": {"$sum": "$quantity"},
+                    "total_cost": {"$sum": "$total_cost"}
+                }},
+                {"$sort": {"_id": 1}},
+                {"$lookup": {
+                    "from": "payment_status",
+                    "localField": "_id",
+                    "foreignField": "person",
+                    "as": "payment"
+                }},
+                {"$project": {
+                    "quantity": 1,
+                    "total_cost": 1,
+                    "payment": {"$filter": {
+                        "input": "$payment",
+                        "as": "status",
+                        "cond": {"$and": [
+                            {"$eq": ["$$status.year", year]},
+                            {"$eq": ["$$status.month", month]}
+                        ]}
+                    }}
+                }}
+            ],
+            "calendar": [
+                {"$group": {
+                    "_id": {"day": {"$dayOfMonth": "$date"}, "person": "$person"},
+                    "quantity": {"$sum": "$quantity"},
+                    "total_cost": {"$sum": "$total_cost"}
+                }},
+                {"$sort": {"_id.day": 1, "_id.person": 1}}
+            ],
+            "purchases": [
+                {"$project": {
+                    "date": 1,
+                    "person": 1,
+                    "quantity": 1,
+                    "price_per_liter": 1,
+                    "total_cost": 1
+                }}
+            ]
+        }}
+    ]
+    
+    result = None
+    async for result in database.purchases.aggregate(pipeline):
+        pass
+    
+    summary = {
+        "total_quantity": 0,
+        "total_cost": 0,
+        "purchase_count": 0,
+        "person_costs": {},
+        "person_quantities": {},
+        "payment_statuses": {},
+        "daily": {},
+        "purchases": []
+    }
+    if not result:
+        return summary
+    
+    if result["totals"]:
+        totals = result["totals"][0]
+        summary["total_quantity"] = totals["total_quantity"]
+        summary["total_cost"] = totals["total_cost"]
+        summary["purchase_count"] = totals["purchase_count"]
+    for entry in result["people"]:
+        person = entry["_id"]
+        summary["person_costs"][person] = entry["total_cost"]
+        summary["person_quantities"][person] = entry["quantity"]
+        summary["payment_statuses"][person] = bool(entry["payment"] and entry["payment"][0].get("paid", False))
+    for cell in result["calendar"]:
+        summary["daily"].setdefault(cell["_id"]["day"], {})[cell["_id"]["person"]] = {
+            "quantity": cell["quantity"],
+            "cost": cell["total_cost"]
+        }
+    summary["purchases"] = result["purchases"]
+    cache.set(cache_key, summary)
+    return summary
+
+async def rebuild_rollups():
     database = get_database()
     pipeline = [
+        {"$project": {
+            "date": 1,
+            "quantity": 1,
+            "entries": {"$cond": [
+                {"$ifNull": ["$person", False]},
+                [{"person": "$person", "total_cost": "$total_cost"}],
+                {"$map": {
+                    "input": {"$ifNull": ["$people", []]},
+                    "as": "p",
+                    "in": {
+                        "person": "$$p",
+                        "total_cost": {"$ifNull": ["$cost_per_person", "$total_cost"]}
+                    }
+                }}
+            ]}
+        }},
+        {"$unwind": "$entries"},
         {"$group": {
             "_id": {
                 "year": {"$year": "$date"},
-                "month": {"$month": "$date"}
-            }
+                "month": {"$month": "$date"},
+                "day": {"$dayOfMonth": "$date"},
+                "person": "$entries.person"
+            },
+            "quantity": {"$sum": "$quantity"},
+            "total_cost": {"$sum": "$entries.total_cost"},
+            "count": {"$sum": 1}
         }},
-        {"$sort": {"_id.year": -1, "_id.month": -1}}
+        {"$project": {
+            "_id": 0,
+            "year": "$_id.year",
+            "month": "$_id.month",
+            "day": "$_id.day",
+            "person": "$_id.person",
+            "quantity": 1,
+            "total_cost": 1,
+            "count": 1
+        }},
+        {"$out": "purchase_rollups"}
     ]
+    async for _ in database.purchases.aggregate(pipeline):
+        pass
     
+    # The month catalogue is derived from the rollups
+    async for _ in database.purchase_rollups.aggregate([
+        {"$group": {
+            "_id": {"year": "$year", "month": "$month"},
+            "count": {"$sum": "$count"}
+        }},
+        {"$project": {
+            "_id": {"$concat": [
+                {"$toString": "$_id.year"},
+                "-",
+                {"$cond": [{"$lt": ["$_id.month", 10]}, "0", ""]},
+                {"$toString": "$_id.month"}
+            ]},
+            "year": "$_id.year",
+            "month": "$_id.month",
+            "count": 1
+        }},
+        {"$out": "purchase_months"}
+    ]):
+        pass
+    await invalidate_cache("available_months")
+    return await database.purchase_rollups.count_documents({})
+
+async def get_available_months():
+    cache = get_cache("available_months")
+    months = cache.get("all")
+    if months is not None:
+        return months
+    
+    database = get_database()
     months = []
-    async for result in database.purchases.aggregate(pipeline):
-        months.append({
-            "year": result["_id"]["year"],
-            "month": result["_id"]["month"]
-        })
+    async for entry in database.purchase_months.find(
+        {"count": {"$gt": 0}}, {"_id": 0, "year": 1, "month": 1}
+    ).sort([("year", -1), ("month", -1)]):
+        months.append({"year": entry["year"], "month": entry["month"]})
+    cache.set("all", months)
     return months
+
+async def _read_purchases(query: dict, limit: int = 0):
     database = get_database()
-    purchase = await database.purchases.find_one({"_id": ObjectId(purchase_id)})
-    if purchase:
-        if 'person' not in purchase and 'people' in purchase:
-            # Handle old schema
-            return None  # Skip old format for editing
-        return Purchase(**purchase)
-    return None
+    if "person" not in query:
+        query = {**query, "person": {"$exists": True}}
+    # _id breaks ties between purchases on the same date so keyset pages are stable
+    cursor = database.purchases.find(query, PURCHASE_PROJECTION).sort([("date", -1), ("_id", -1)])
+    if limit:
+        cursor = cursor.limit(limit)
+    return [PurchaseRow.from_document(purchase) async for purchase in cursor]
 
 async def get_daily_purchases(date: datetime):
-    database = get_database()
     start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_date = start_date + timedelta(days=1)
-    
-    purchases = []
-    async for purchase in database.purchases.find({
-        "date": {"$gte": start_date, "$lt": end_date}
-    }).sort("date", -1):
-        if 'person' not in purchase and 'people' in purchase:
-            for person in purchase['people']:
-                new_purchase = {
-                    '_id': purchase['_id'],
-                    'date': purchase['date'],
-                    'person': person,
-                    'quantity': purchase['quantity'],
-                    'price_per_liter': purchase['price_per_liter'],
-                    'total_cost': purchase.get('cost_per_person', purchase['total_cost'])
-                }
-                purchases.append(Purchase(**new_purchase))
-        elif 'person' in purchase:
-            purchases.append(Purchase(**purchase))
-    return purchases
+    return await _read_purchases({"date": {"$gte": start_date, "$lt": end_date}})
 
 async def get_monthly_purchases(year: int, month: int):
+    start_date, end_date = _month_range(year, month)
+    return await _read_purchases({"date": {"$gte": start_date, "$lt": end_date}})
+
+async def stream_purchases(start_date: datetime = None, end_date: datetime = None, batch_size: int = 500):
     database = get_database()
-    start_date = datetime(year, month, 1)
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        end_date = datetime(year, month + 1, 1)
+    query = {}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lt"] = end_date
     
-    purchases = []
-    async for purchase in database.purchases.find({
-        "date": {"$gte": start_date, "$lt": end_date}
-    }).sort("date", -1):
-        if 'person' not in purchase and 'people' in purchase:
-            for person in purchase['people']:
-                new_purchase = {
-                    '_id': purchase['_id'],
-                    'date': purchase['date'],
-                    'person': person,
-                    'quantity': purchase['quantity'],
-                    'price_per_liter': purchase['price_per_liter'],
-                    'total_cost': purchase.get('cost_per_person', purchase['total_cost'])
-                }
-                purchases.append(Purchase(**new_purchase))
-        elif 'person' in purchase:
-            purchases.append(Purchase(**purchase))
-    return purchases
+    query["person"] = {"$exists": True}
+    
+    cursor = database.purchases.find(query, PURCHASE_PROJECTION).sort("date", 1).batch_size(batch_size)
+    async for purchase in cursor:
+        yield {
+            'id': str(purchase['_id']),
+            'date': purchase['date'],
+            'person': purchase['person'],
+            'quantity': purchase['quantity'],
+            'price_per_liter': purchase['price_per_liter'],
+            'total_cost': purchase['total_cost']
+        }
 
 async def get_recent_purchases(limit: int = 10):
-    database = get_database()
-    purchases = []
-    async for purchase in database.purchases.find().sort("date", -1).limit(limit):
-        # Handle old schema with 'people' field
-        if 'person' not in purchase and 'people' in purchase:
-            for person in purchase['people']:
-                new_purchase = {
-                    '_id': purchase['_id'],
-                    'date': purchase['date'],
-                    'person': person,
-                    'quantity': purchase['quantity'],
-                    'price_per_liter': purchase['price_per_liter'],
-                    'total_cost': purchase.get('cost_per_person', purchase['total_cost'])
-                }
-                purchases.append(Purchase(**new_purchase))
-        elif 'person' in purchase:
-            purchases.append(Purchase(**purchase))
-    return purchases
+    return await _read_purchases({}, limit)
+
+def encode_history_cursor(cursor: tuple):
+    date, purchase_id = cursor
+    return f"{date.strftime('%Y%m%d%H%M%S%f')}.{purchase_id}"
+
+def decode_history_cursor(value: str):
+    date, purchase_id = value.split(".")
+    try:
+        purchase_id = ObjectId(purchase_id)
+    except InvalidId as e:
+        # Callers treat a bad cursor as a ValueError
+        raise ValueError(str(e))
+    return datetime.strptime(date, "%Y%m%d%H%M%S%f"), purchase_id
+
+async def get_purchase_history(
+    limit: int = 20,
+    before: tuple = None,
+    person: str = None,
+    start_date: datetime = None,
+    end_date: datetime = None
+):
+    # Seeks on (date, _id) instead of skipping, so deep pages cost the same as the first
+    query = {}
+    if person:
+        query["person"] = person
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lt"] = end_date
+    if before:
+        before_date, before_id = before
+        query["$or"] = [
+            {"date": {"$lt": before_date}},
+            {"date": before_date, "_id": {"$lt": before_id}}
+        ]
+    
+    purchases = await _read_purchases(query, limit + 1)
+    next_cursor = None
+    if len(purchases) > limit:
+        purchases = purchases[:limit]
+        next_cursor = (purchases[-1].date, purchases[-1].id)
+    return purchases, next_cursor
+
 async def get_purchase_by_id(purchase_id: str):
     database = get_database()
-    purchase = await database.purchases.find_one({"_id": ObjectId(purchase_id)})
-    if purchase:
-        if 'person' not in purchase and 'people' in purchase:
-            # Handle old schema
-            return None  # Skip old format for editing
+    purchase = await database.purchases.find_one({"_id": ObjectId(purchase_id)}, PURCHASE_PROJECTION)
+    if purchase and 'person' in purchase:
         return Purchase(**purchase)
-    return None
\ No newline at end of file
+    return None
+
+
+async def create_standing_order(order: StandingOrder):
+    database = get_database()
+    result = await database.standing_orders.insert_one(order.model_dump(by_alias=True, exclude={"id", "materialized_through"}))
+    return str(result.inserted_id)
+
+async def get_standing_orders(active_only: bool = False):
+    database = get_database()
+    query = {"active": True} if active_only else {}
+    return [StandingOrder(**order) async for order in database.standing_orders.find(query).sort("person", 1)]
+
+async def delete_standing_order(order_id: str):
+    database = get_database()
+    await database.standing_orders.delete_one({"_id": ObjectId(order_id)})
+    
+    # Drop deliveries that were generated ahead of time
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    query = {"standing_order_id": ObjectId(order_id), "date": {"$gte": today}}
+    upcoming = await database.purchases.find(query).to_list(None)
+    if upcoming:
+        await database.purchases.delete_many({"_id": {"$in": [purchase["_id"] for purchase in upcoming]}})
+        await _apply_purchase_deltas(upcoming, -1)
+        await record_changes([deletion_change("purchase", str(purchase["_id"]), purchase) for purchase in upcoming])
+
+async def materialize_standing_orders(start_date: datetime, days: int = 1):
+    orders = await get_standing_orders(active_only=True)
+    if not orders:
+        return 0
+    
+    milk_rate = await get_milk_rate()
+    start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_date = start_date + timedelta(days=days - 1)
+    operations = []
+    documents = []
+    for offset in range(days):
+        date = start_date + timedelta(days=offset)
+        for order in orders:
+            if date.weekday() not in order.weekdays:
+                continue
+            if order.start_date and date < order.start_date:
+                continue
+            # Days already generated stay as the user left them: deleted or re-dated deliveries never come back
+            if order.materialized_through and date <= order.materialized_through:
+                continue
+            price_per_liter = order.price_per_liter if order.price_per_liter is not None else milk_rate
+            document = {
+                "date": date,
+                "person": order.person,
+                "quantity": order.quantity,
+                "price_per_liter": price_per_liter,
+                "total_cost": order.quantity * price_per_liter,
+                "schema_version": PURCHASE_SCHEMA_VERSION,
+                "standing_order_id": order.id,
+                "rev": 1
+            }
+            # Keyed on (order, person, date) so re-running a day never duplicates deliveries
+            operations.append(UpdateOne(
+                {"standing_order_id": order.id, "person": order.person, "date": date},
+                {"$setOnInsert": document},
+                upsert=True
+            ))
+            documents.append(document)
+    
+    database = get_database()
+    created = []
+    if operations:
+        result = await database.purchases.bulk_write(operations, ordered=False)
+        created = [{**documents[index], "_id": upserted_id} for index, upserted_id in result.upserted_ids.items()]
+        await _apply_purchase_deltas(created, 1)
+        await record_changes([purchase_change(document) for document in created])
+    # Advance the watermark only after the deliveries are written; a crash in between reruns the upserts above
+    await database.standing_orders.update_many(
+        {"_id": {"$in": [order.id for order in orders]}},
+        {"$max": {"materialized_through": end_date}}
+    )
+    return len(created)
+
+async def materialize_upcoming_standing_orders(days: int = 7):
+    return await materialize_standing_orders(datetime.now(), days)
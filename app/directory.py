@@ -0,0 +1,53 @@
+from .models import Person
+
+class PeopleDirectory:
+    """In-memory copy of the people collection with name and id lookups"""
+    
+    def __init__(self):
+        self.version = None
+        self._people = []
+        self._by_name = {}
+        self._by_id = {}
+    
+    def is_current(self, version: int):
+        return self.version == version
+    
+    def load(self, people: list, version: int):
+        self._people = list(people)
+        self._reindex()
+        self.version = version
+    
+    def _reindex(self):
+        self._by_name = {person.name: person for person in self._people}
+        self._by_id = {str(person.id): person for person in self._people}
+    
+    def apply(self, version: int, change):
+        # Apply our own write in place only if no other write happened in between
+        if self.version is not None and version == self.version + 1:
+            change()
+            self._reindex()
+            self.version = version
+        else:
+            self.version = None
+    
+    def add(self, person: Person):
+        self._people.append(person)
+    
+    def update(self, person_id: str, name: str, email: str):
+        person = self._by_id.get(person_id)
+        if person:
+            self._people[self._people.index(person)] = person.model_copy(update={"name": name, "email": email})
+    
+    def remove(self, person_id: str):
+        self._people = [person for person in self._people if str(person.id) != person_id]
+    
+    def all(self):
+        return self._people
+    
+    def by_name(self, name: str):
+        return self._by_name.get(name)
+    
+    def by_id(self, person_id: str):
+        return self._by_id.get(person_id)
+
+people_directory = PeopleDirectory()
@@ -1,58 +1,94 @@
+import asyncio
 import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List
-from .database import get_monthly_purchases, get_people
+from .database import get_monthly_rollup, get_people, get_database
+from .metrics import emails_sent
+from .scheduler import current_lease, check_lease
 
-async def send_monthly_summary():
-    now = datetime.now()
-    last_month = now.month - 1 if now.month > 1 else 12
-    year = now.year if now.month > 1 else now.year - 1
-    
-    purchases = await get_monthly_purchases(year, last_month)
-    people = await get_people()
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_DELAY = 300  # seconds, doubled after every failed attempt
+
+class SMTPDispatcher:
+    """Sends batches over a few reused SMTP connections on worker threads"""
     
-    if not purchases:
-        return
+    def __init__(self, pool_size: int = EMAIL_POOL_SIZE):
+        self.pool_size = max(1, pool_size)
     
-    total_cost = sum(p.get('total_cost', 0) for p in purchases)
-    total_quantity = sum(p.get('quantity', 0) for p in purchases)
+    def _connect(self):
+        server = smtplib.SMTP(os.getenv("SMTP_SERVER"), int(os.getenv("SMTP_PORT")), timeout=30)
+        # Local stand-in servers usually speak plain SMTP without auth
+        if os.getenv("SMTP_STARTTLS", "true").lower() != "false":
+            server.starttls()
+        email_user = os.getenv("EMAIL_USER")
+        email_password = os.getenv("EMAIL_PASSWORD")
+        if email_user and email_password:
+            server.login(email_user, email_password)
+        return server
     
-    # Group by person
-    person_costs = {}
-    for purchase in purchases:
-        person = purchase.get('person')
-        cost = purchase.get('total_cost', 0)
-        if person:
-            if person not in person_costs:
-                person_costs[person] = 0
-            person_costs[person] += cost
+    def _send_chunk(self, messages: List[dict]):
+        sender = os.getenv("EMAIL_USER")
+        failures = []
+        unsent = []
+        server = None
+        lease = current_lease.get()
+        for index, message in enumerate(messages):
+            # Stop once a scheduled job loses its lease; the caller keeps the rest in the outbox
+            if lease is not None and not lease.held:
+                unsent = messages[index:]
+                break
+            try:
+                if server is None:
+                    server = self._connect()
+                try:
+                    server.sendmail(sender, message["email"], _build_mime(sender, message).as_string())
+                except smtplib.SMTPServerDisconnected:
+                    # Reconnect once if the server dropped an idle connection
+                    server = self._connect()
+                    server.sendmail(sender, message["email"], _build_mime(sender, message).as_string())
+                print(f"Email sent to {message['name']} ({message['email']})")
+                emails_sent.inc("sent")
+            except Exception as e:
+                print(f"Failed to send email to {message['name']}: {str(e)}")
+                emails_sent.inc("failed")
+                failures.append((message, str(e)))
+                if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                    server = None
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return failures, unsent
     
-    # Send email to each person
-    for person in people:
-        if person.name in person_costs:
-            await send_email_to_person(
-                person.email, 
-                person.name, 
-                person_costs[person.name],
-                total_quantity,
-                len([p for p in purchases if p.get('person') == person.name]),
-                f"{year}-{last_month:02d}"
-            )
+    async def send_batch(self, messages: List[dict]):
+        """Returns (failures as (message, error) pairs, messages never attempted)"""
+        if not messages:
+            return [], []
+        chunks = [messages[i::self.pool_size] for i in range(self.pool_size)]
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self._send_chunk, chunk) for chunk in chunks if chunk
+        ])
+        return (
+            [failure for failures, _ in results for failure in failures],
+            [message for _, unsent in results for message in unsent]
+        )
 
-async def send_email_to_person(email: str, name: str, cost: float, quantity: float, purchase_count: int, month: str):
-    smtp_server = os.getenv("SMTP_SERVER")
-    smtp_port = int(os.getenv("SMTP_PORT"))
-    email_user = os.getenv("EMAIL_USER")
-    email_password = os.getenv("EMAIL_PASSWORD")
-    
+dispatcher = SMTPDispatcher()
+
+def _build_mime(sender: str, message: dict):
     msg = MIMEMultipart()
-    msg['From'] = email_user
-    msg['To'] = email
-    msg['Subject'] = f"Monthly Milk Summary - {month}"
-    
+    msg['From'] = sender
+    msg['To'] = message["email"]
+    msg['Subject'] = message["subject"]
+    msg.attach(MIMEText(message["body"], 'plain'))
+    return msg
+
+def build_summary_email(email: str, name: str, cost: float, quantity: float, purchase_count: int, month: str):
     body = f"""
     Hi {name},
     
@@ -67,16 +103,94 @@ async def send_email_to_person(email: str, name: str, cost: float, quantity: flo
     Best regards,
     Milk Tracker Team
     """
+    return {
+        "email": email,
+        "name": name,
+        "subject": f"Monthly Milk Summary - {month}",
+        "body": body
+    }
+
+async def queue_failed_emails(failures: list, unsent: list = ()):
+    if not failures and not unsent:
+        return
+    database = get_database()
+    now = datetime.now()
+    await database.email_outbox.insert_many([
+        {
+            **message,
+            "status": "pending",
+            "attempts": 1,
+            "last_error": error,
+            "next_attempt_at": now + timedelta(seconds=EMAIL_RETRY_BASE_DELAY),
+            "created_at": now
+        }
+        for message, error in failures
+    ] + [
+        # Never attempted, so due right away and without using up an attempt
+        {**message, "status": "pending", "attempts": 0, "last_error": None, "next_attempt_at": now, "created_at": now}
+        for message in unsent
+    ])
+
+async def retry_failed_emails():
+    database = get_database()
+    pending = await database.email_outbox.find({
+        "status": "pending",
+        "next_attempt_at": {"$lte": datetime.now()}
+    }).to_list(500)
+    if not pending:
+        return
+    
+    messages = [{
+        "_id": entry["_id"],
+        "email": entry["email"],
+        "name": entry["name"],
+        "subject": entry["subject"],
+        "body": entry["body"]
+    } for entry in pending]
+    failures, unsent = await dispatcher.send_batch(messages)
+    failures = {message["_id"]: error for message, error in failures}
+    unsent = {message["_id"] for message in unsent}
+    
+    now = datetime.now()
+    for entry in pending:
+        # Left pending as they are for the next run
+        if entry["_id"] in unsent:
+            continue
+        if entry["_id"] not in failures:
+            await database.email_outbox.delete_one({"_id": entry["_id"]})
+            continue
+        attempts = entry["attempts"] + 1
+        update = {"attempts": attempts, "last_error": failures[entry["_id"]]}
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            update["status"] = "failed"
+            emails_sent.inc("abandoned")
+        else:
+            update["next_attempt_at"] = now + timedelta(seconds=EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        await database.email_outbox.update_one({"_id": entry["_id"]}, {"$set": update})
+
+async def send_monthly_summary():
+    now = datetime.now()
+    last_month = now.month - 1 if now.month > 1 else 12
+    year = now.year if now.month > 1 else now.year - 1
+    
+    summary = await get_monthly_rollup(year, last_month)
+    if not summary["purchase_count"]:
+        return
     
-    msg.attach(MIMEText(body, 'plain'))
+    people = await get_people()
+    messages = []
+    for person in people:
+        if person.email and person.name in summary["person_costs"]:
+            messages.append(build_summary_email(
+                person.email,
+                person.name,
+                summary["person_costs"][person.name],
+                summary["total_quantity"],
+                summary["person_counts"][person.name],
+                f"{year}-{last_month:02d}"
+            ))
     
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(email_user, email_password)
-        text = msg.as_string()
-        server.sendmail(email_user, email, text)
-        server.quit()
-        print(f"Email sent to {name} ({email})")
-    except Exception as e:
-        print(f"Failed to send email to {name}: {str(e)}")
\ No newline at end of file
+    failures, unsent = await dispatcher.send_batch(messages)
+    # A monthly slot never fires again, so whatever did not go out is handed to the retry job
+    await queue_failed_emails(failures, unsent)
+    check_lease()
@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from .database import get_database, rebuild_rollups, record_changes, deletion_change
+
+# Every index the app relies on, applied idempotently at startup and by create_indexes.py
+INDEXES = {
+    "purchases": [
+        # Daily and monthly date range reads
+        IndexModel([("date", DESCENDING)], name="date"),
+        IndexModel([("date", DESCENDING), ("person", ASCENDING)], name="date_person"),
+        # Keyset pagination of the purchase history, overall and per person
+        IndexModel([("date", DESCENDING), ("_id", DESCENDING)], name="date_id"),
+        IndexModel([("person", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="person_date_id"),
+        # Standing-order deliveries are upserted on (order, person, date)
+        IndexModel(
+            [("standing_order_id", ASCENDING), ("person", ASCENDING), ("date", ASCENDING)],
+            name="standing_order_person_date",
+            unique=True,
+            partialFilterExpression={"standing_order_id": {"$exists": True}}
+        ),
+        # Legacy migration upserts one document per (legacy purchase, person); unique so
+        # workers migrating the same batch at once cannot both insert
+        IndexModel(
+            [("legacy_id", ASCENDING), ("person", ASCENDING)],
+            name="legacy_person",
+            unique=True,
+            partialFilterExpression={"legacy_id": {"$exists": True}}
+        )
+    ],
+    # Unique key for the daily per-person rollups kept up to date by the write paths
+    "purchase_rollups": [
+        IndexModel(
+            [("year", ASCENDING), ("month", ASCENDING), ("day", ASCENDING), ("person", ASCENDING)],
+            name="year_month_day_person",
+            unique=True
+        )
+    ],
+    # Month picker reads the catalogue newest first
+    "purchase_months": [
+        IndexModel([("year", DESCENDING), ("month", DESCENDING)], name="year_month")
+    ],
+    # One payment record per person and month; also serves the summary's $lookup on person
+    "payment_status": [
+        IndexModel(
+            [("person", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)],
+            name="person_year_month",
+            unique=True
+        )
+    ],
+    "people": [
+        IndexModel([("name", ASCENDING)], name="name")
+    ],
+    # Retry job picks up pending emails that are due
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt")
+    ],
+    # Change log compaction matches on age; sync reads page through _id (the sequence number)
+    "change_log": [
+        IndexModel([("at", ASCENDING)], name="at")
+    ],
+    # Scheduled job history, looked up per job and slot before each run
+    "job_runs": [
+        IndexModel([("job", ASCENDING), ("slot", ASCENDING)], name="job_slot")
+    ]
+}
+
+async def _dedupe_payment_status():
+    # Racing toggles used to insert duplicates; keep the newest record per person and month
+    database = get_database()
+    duplicates = database.payment_status.aggregate([
+        {"$sort": {"_id": -1}},
+        {"$group": {
+            "_id": {"person": "$person", "year": "$year", "month": "$month"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+    stale = []
+    async for group in duplicates:
+        stale.extend(group["ids"][1:])
+    if stale:
+        await database.payment_status.delete_many({"_id": {"$in": stale}})
+    return len(stale)
+
+async def _dedupe_legacy_purchases():
+    # Concurrent migrations could insert the same (legacy purchase, person) row twice; keep the first
+    database = get_database()
+    duplicates = database.purchases.aggregate([
+        {"$match": {"legacy_id": {"$exists": True}}},
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"legacy_id": "$legacy_id", "person": "$person"},
+            "rows": {"$push": {"_id": "$_id", "rev": "$rev"}},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+    stale = []
+    async for group in duplicates:
+        stale.extend(group["rows"][1:])
+    if stale:
+        await database.purchases.delete_many({"_id": {"$in": [row["_id"] for row in stale]}})
+        await record_changes([deletion_change("purchase", str(row["_id"]), row) for row in stale])
+        await rebuild_rollups()
+    return len(stale)
+
+# Unique indexes that older data may violate, and how to clean it up
+DEDUPERS = {
+    "person_year_month": _dedupe_payment_status,
+    "legacy_person": _dedupe_legacy_purchases
+}
+
+async def ensure_indexes():
+    database = get_database()
+    created = 0
+    for collection, indexes in INDEXES.items():
+        # Indexes made by older create_indexes.py runs carry generated names; match them on keys
+        existing = {
+            tuple(info["key"]): (existing_name, info)
+            for existing_name, info in (await database[collection].index_information()).items()
+        }
+        for index in indexes:
+            name = index.document["name"]
+            current = existing.get(tuple(index.document["key"].items()))
+            try:
+                if current is not None:
+                    if current[1].get("unique", False) == index.document.get("unique", False):
+                        continue
+                    # The index gained a unique constraint since it was created
+                    await database[collection].drop_index(current[0])
+                try:
+                    await database[collection].create_indexes([index])
+                except DuplicateKeyError:
+                    if name not in DEDUPERS:
+                        raise
+                    removed = await DEDUPERS[name]()
+                    print(f"Removed {removed} duplicate {collection} records")
+                    await database[collection].create_indexes([index])
+                created += 1
+            except OperationFailure as e:
+                print(f"Could not ensure index {collection}.{name}: {e}")
+    return created
+
+def _hot_queries():
+    # The find shapes used by app/database.py on request paths; whole-collection loads
+    # of tiny collections (people, settings, data_versions) are left out on purpose
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    person_filter = {"person": {"$exists": True}}
+    newest_first = [("date", -1), ("_id", -1)]
+    return [
+        ("get_daily_purchases", "purchases",
+         {"date": {"$gte": today, "$lt": today + timedelta(days=1)}, **person_filter}, newest_first),
+        ("get_monthly_purchases", "purchases",
+         {"date": {"$gte": month_start, "$lt": month_end}, **person_filter}, newest_first),
+        ("get_monthly_summary", "purchases",
+         {"date": {"$gte": month_start, "$lt": month_end}}, [("date", -1)]),
+        ("get_recent_purchases", "purchases", person_filter, newest_first),
+        ("get_purchase_history", "purchases",
+         {"person": "example", "$or": [
+             {"date": {"$lt": today}},
+             {"date": today, "_id": {"$lt": ObjectId()}}
+         ]}, newest_first),
+        ("stream_purchases", "purchases",
+         {"date": {"$gte": month_start, "$lt": month_end}, **person_filter}, [("date", 1)]),
+        ("get_purchase_by_id", "purchases", {"_id": ObjectId()}, None),
+        ("delete_standing_order", "purchases",
+         {"standing_order_id": ObjectId(), "date": {"$gte": today}}, None),
+        ("get_daily_rollup", "purchase_rollups",
+         {"year": today.year, "month": today.month, "day": today.day}, None),
+        ("get_monthly_rollup", "purchase_rollups",
+         {"year": today.year, "month": today.month}, [("day", 1), ("person", 1)]),
+        ("get_available_months", "purchase_months", {"count": {"$gt": 0}}, [("year", -1), ("month", -1)]),
+        ("payment_status", "payment_status",
+         {"person": "example", "month": today.month, "year": today.year}, None),
+        ("retry_failed_emails", "email_outbox",
+         {"status": "pending", "next_attempt_at": {"$lte": today}}, None),
+        ("singleton_job", "job_runs", {"job": "example", "slot": "example", "status": "succeeded"}, None)
+    ]
+
+def plan_stages(plan: dict):
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+async def explain_hot_queries():
+    database = get_database()
+    plans = []
+    for name, collection, query, sort in _hot_queries():
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explained = await database.command("explain", command, verbosity="queryPlanner")
+        plans.append((name, collection, plan_stages(explained["queryPlanner"]["winningPlan"])))
+    return plans
@@ -0,0 +1,195 @@
+import threading
+import time
+from bisect import bisect_left
+from pymongo import monitoring
+
+# Seconds; covers sub-millisecond cache hits up to slow PDF builds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+_registry = []
+
+def _format_labels(names: tuple, values: tuple, extra: str = ""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic count per label set; safe to update from driver and SMTP threads"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts plus +Inf, sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve a request by route template",
+    ("method", "route", "status")
+)
+mongodb_command_duration = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round-trip time as reported by the driver",
+    ("command",)
+)
+mongodb_command_failures = Counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error", ("command",)
+)
+mongodb_pool_checkout_wait = Histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("outcome",)
+)
+template_render_duration = Histogram(
+    "template_render_seconds", "Jinja2 render time per template", ("template",)
+)
+pdf_build_duration = Histogram(
+    "pdf_build_seconds", "PDF build time in the worker pool, excluding cache hits", ("engine",)
+)
+pdf_size = Histogram(
+    "pdf_size_bytes", "Size of freshly built PDFs", ("engine",), buckets=SIZE_BUCKETS
+)
+emails_sent = Counter(
+    "emails_sent_total", "Email delivery attempts by outcome", ("outcome",)
+)
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1e6, event.command_name)
+        mongodb_command_failures.inc(event.command_name)
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Times checkouts; start and end of a checkout always happen on the same thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _observe(self, outcome: str):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            mongodb_pool_checkout_wait.observe(time.perf_counter() - started, outcome)
+            self._local.started = None
+
+    def connection_checked_out(self, event):
+        self._observe("success")
+
+    def connection_check_out_failed(self, event):
+        self._observe(event.reason)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+def mongo_event_listeners():
+    return [CommandMetricsListener(), PoolMetricsListener()]
+
+class MetricsMiddleware:
+    """Pure ASGI middleware so streaming responses are timed to their last byte"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope; label by its template to bound cardinality
+            route = scope.get("route")
+            label = route.path if route is not None else scope.get("root_path") or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], label, str(status[0]))
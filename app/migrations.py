@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from .database import get_database, rebuild_rollups, record_changes, purchase_change, PURCHASE_SCHEMA_VERSION
+from .scheduler import hold_lease
+
+LEGACY_PURCHASE_MIGRATION = "purchases_person_schema"
+ROLLUPS_BACKFILL = "rollups_v1"
+
+def _expand_legacy_purchase(purchase: dict):
+    cost = purchase.get('cost_per_person', purchase['total_cost'])
+    documents = []
+    for person in purchase['people']:
+        documents.append({
+            "date": purchase['date'],
+            "person": person,
+            "quantity": purchase['quantity'],
+            "price_per_liter": purchase['price_per_liter'],
+            "total_cost": cost,
+            "schema_version": PURCHASE_SCHEMA_VERSION,
+            "legacy_id": purchase['_id'],
+            "rev": 1
+        })
+    return documents
+
+async def migrate_legacy_purchases(batch_size: int = 500, pause: float = 0.05):
+    database = get_database()
+    checkpoint = await database.migrations.find_one({"_id": LEGACY_PURCHASE_MIGRATION})
+    if checkpoint and checkpoint.get("done"):
+        return 0
+    
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    migrated = checkpoint.get("migrated", 0) if checkpoint else 0
+    
+    while True:
+        query = {"person": {"$exists": False}, "people": {"$exists": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await database.purchases.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        operations = []
+        # Operation index -> document, so offline clients get the rows the migration wrote
+        written = {}
+        for purchase in batch:
+            documents = _expand_legacy_purchase(purchase)
+            if not documents:
+                continue
+            # The first person keeps the original _id, the rest are upserted by (legacy_id, person)
+            # so a rerun after a crash or a concurrent worker never duplicates rows
+            written[len(operations)] = {**documents[0], "_id": purchase['_id']}
+            operations.append(ReplaceOne(
+                {"_id": purchase['_id'], "people": {"$exists": True}},
+                documents[0]
+            ))
+            for document in documents[1:]:
+                written[len(operations)] = document
+                operations.append(UpdateOne(
+                    {"legacy_id": purchase['_id'], "person": document['person']},
+                    {"$setOnInsert": document},
+                    upsert=True
+                ))
+        if operations:
+            try:
+                upserted_ids = (await database.purchases.bulk_write(operations, ordered=False)).upserted_ids
+            except BulkWriteError as e:
+                # Another worker upserted the same (legacy_id, person) row first; the unique index kept one
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+                upserted_ids = {upsert["index"]: upsert["_id"] for upsert in e.details.get("upserted", [])}
+            changes = []
+            for index in sorted(written):
+                document = written[index]
+                if index in upserted_ids:
+                    document = {**document, "_id": upserted_ids[index]}
+                elif "_id" not in document:
+                    # Matched a row an earlier, interrupted run already wrote and logged
+                    continue
+                changes.append(purchase_change(document))
+            await record_changes(changes)
+        
+        last_id = batch[-1]['_id']
+        migrated += len(batch)
+        await database.migrations.update_one(
+            {"_id": LEGACY_PURCHASE_MIGRATION},
+            {"$set": {"last_id": last_id, "migrated": migrated}},
+            upsert=True
+        )
+        # Yield to request handlers between batches
+        await asyncio.sleep(pause)
+    
+    await database.migrations.update_one(
+        {"_id": LEGACY_PURCHASE_MIGRATION},
+        {"$set": {"done": True, "migrated": migrated}},
+        upsert=True
+    )
+    return migrated
+
+async def backfill_rollups():
+    # Deployments that predate the rollups and month catalogue build them once. Completion is recorded
+    # explicitly: purchases written since startup already add rollup rows, so their presence proves nothing
+    database = get_database()
+    if await database.migrations.find_one({"_id": ROLLUPS_BACKFILL, "done": True}):
+        return False
+    built = bool(await database.purchases.find_one())
+    if built:
+        await rebuild_rollups()
+    await database.migrations.update_one(
+        {"_id": ROLLUPS_BACKFILL},
+        {"$set": {"done": True, "finished_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return built
+
+async def run_startup_migrations():
+    # Every worker starts at once; the first to take the lease migrates, the rest skip
+    async with hold_lease("startup_migrations") as lease:
+        if lease is None:
+            return
+        # Rollups first: they already count legacy documents, and the month picker, PDFs and emails need them,
+        # while the legacy migration can take a long time
+        try:
+            if await backfill_rollups():
+                print("Built purchase rollups and month catalogue from existing purchases")
+        except Exception as e:
+            print(f"Failed to build purchase rollups, will retry on next start: {str(e)}")
+        try:
+            migrated = await migrate_legacy_purchases()
+            if migrated:
+                print(f"Migrated {migrated} legacy purchases to the per-person schema")
+        except Exception as e:
+            print(f"Legacy purchase migration failed, will resume on next start: {str(e)}")
@@ -69,6 +69,46 @@ class Purchase(BaseModel):
     price_per_liter: float
     total_cost: float
 
+class StandingOrder(BaseModel):
+    model_config = ConfigDict(
+        populate_by_name=True,
+        arbitrary_types_allowed=True,
+        json_encoders={ObjectId: str}
+    )
+    
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    person: str
+    quantity: float  # liters per delivery
+    price_per_liter: Optional[float] = None  # None uses the milk rate at generation time
+    weekdays: List[int] = [0, 1, 2, 3, 4, 5, 6]  # Monday is 0
+    active: bool = True
+    start_date: Optional[datetime] = None
+    # Last day deliveries were generated for; later runs only add days after it
+    materialized_through: Optional[datetime] = None
+
+class PurchaseRow:
+    """Read-only purchase used by list views; built without validation"""
+    __slots__ = ("id", "date", "person", "quantity", "price_per_liter", "total_cost")
+    
+    def __init__(self, id, date, person, quantity, price_per_liter, total_cost):
+        self.id = id
+        self.date = date
+        self.person = person
+        self.quantity = quantity
+        self.price_per_liter = price_per_liter
+        self.total_cost = total_cost
+    
+    @classmethod
+    def from_document(cls, document: dict):
+        return cls(
+            document["_id"],
+            document["date"],
+            document["person"],
+            document["quantity"],
+            document["price_per_liter"],
+            document["total_cost"]
+        )
+
 class PurchaseCreate(BaseModel):
     person: str
     quantity: float
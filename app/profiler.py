@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from bson import json_util
+from pymongo import monitoring
+
+# Debugging aid: off unless SLOW_QUERY_PROFILER=true, since every command is tracked while it runs
+PROFILER_ENABLED = os.getenv("SLOW_QUERY_PROFILER", "false").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_HISTORY = int(os.getenv("SLOW_QUERY_HISTORY", "200"))
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Driver and session fields that explain rejects or that only apply to the original run
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "writeConcern", "readConcern", "maxTimeMS"}
+
+# Motor copies the context into its executor threads, so listeners can see the request that issued a command
+current_route = ContextVar("current_route", default=None)
+
+slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+_explain_queue = None
+_loop = None
+
+def _query_shape(command_name: str, command: dict):
+    if command_name == "aggregate":
+        return command.get("pipeline"), None
+    if command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        return statements[0].get("q"), None
+    if command_name == "findAndModify":
+        return command.get("query"), command.get("sort")
+    return command.get("filter", command.get("query")), command.get("sort")
+
+def _explainable(command_name: str, command: dict):
+    if command_name not in EXPLAINABLE_COMMANDS:
+        return None
+    pipeline = command.get("pipeline", [])
+    # Explaining $out/$merge with executionStats would run the write
+    if any("$out" in stage or "$merge" in stage for stage in pipeline):
+        return None
+    return {key: value for key, value in command.items() if not key.startswith("$") and key not in DRIVER_FIELDS}
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self):
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+        with self._lock:
+            self._running[event.request_id] = (event.command, event.database_name, current_route.get())
+
+    def _finish(self, event, error: str = None):
+        with self._lock:
+            running = self._running.pop(event.request_id, None)
+        if running is None or event.duration_micros < SLOW_QUERY_MS * 1000:
+            return
+        command, database_name, route = running
+        query, sort = _query_shape(event.command_name, command)
+        record = {
+            "at": datetime.now(),
+            "route": route or "background",
+            "command": event.command_name,
+            "collection": command.get(event.command_name),
+            "query": json_util.dumps(query) if query is not None else "",
+            "sort": json_util.dumps(sort) if sort else "",
+            "duration_ms": event.duration_micros / 1000,
+            "error": error,
+            "explain": None
+        }
+        slow_queries.appendleft(record)
+        explain_command = _explainable(event.command_name, command)
+        if explain_command is not None and _loop is not None:
+            _loop.call_soon_threadsafe(_explain_queue.put_nowait, (record, database_name, explain_command))
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure))
+
+def slow_query_listeners():
+    return [SlowQueryListener()] if PROFILER_ENABLED else []
+
+def summarize_explain(explained: dict):
+    from .indexes import plan_stages
+    # Classic plans report at the top level; pipelines wrap the query stage in $cursor
+    if "stages" in explained and "$cursor" in explained["stages"][0]:
+        explained = explained["stages"][0]["$cursor"]
+    planner = explained.get("queryPlanner", {})
+    stats = explained.get("executionStats", {})
+    return {
+        "stages": plan_stages(planner.get("winningPlan", {})),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned")
+    }
+
+async def _explain_worker():
+    from .database import db
+    while True:
+        record, database_name, command = await _explain_queue.get()
+        try:
+            explained = await db.client[database_name].command("explain", command, verbosity="executionStats")
+            record["explain"] = summarize_explain(explained)
+        except Exception as e:
+            record["explain"] = {"error": str(e)}
+        route = record["route"]
+        print(f"Slow {record['command']} on {record['collection']} ({record['duration_ms']:.0f} ms) from {route}: "
+              f"{record['query']} {record['explain']}")
+
+def start_profiler():
+    global _explain_queue, _loop
+    if not PROFILER_ENABLED:
+        return None
+    _loop = asyncio.get_running_loop()
+    _explain_queue = asyncio.Queue()
+    return asyncio.create_task(_explain_worker())
+
+class RouteContextMiddleware:
+    """Tags MongoDB commands with the request that issued them"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_route.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
@@ -0,0 +1,62 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .data import load_report_data
+from ..database import get_month_version
+from ..cache import get_cached_pdf, set_cached_pdf
+from ..metrics import pdf_build_duration, pdf_size
+
+# Engines are imported on first use so ReportLab is not loaded at startup
+REPORT_ENGINES = {
+    "compact": "app.reports.compact",
+    "detailed": "app.reports.detailed"
+}
+DEFAULT_REPORT_ENGINE = "compact"
+
+# ReportLab is CPU-bound, so builds run in a small process pool instead of on the event loop
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+_executor = None
+_engines = {}
+
+def get_report_engine(name: str):
+    if name not in REPORT_ENGINES:
+        raise KeyError(f"Unknown report engine '{name}'")
+    engine = _engines.get(name)
+    if engine is None:
+        engine = _engines[name] = importlib.import_module(REPORT_ENGINES[name])
+    return engine
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def shutdown_pdf_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def generate_monthly_pdf(year: int, month: int, engine_name: str = DEFAULT_REPORT_ENGINE):
+    engine = get_report_engine(engine_name)
+    version = await get_month_version(year, month)
+    cache_key = (year, month, version, engine_name)
+    pdf_bytes = get_cached_pdf(cache_key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    
+    data = await load_report_data(year, month)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    pdf_bytes = await loop.run_in_executor(_get_executor(), engine.render, data)
+    pdf_build_duration.observe(time.perf_counter() - started, engine_name)
+    pdf_size.observe(len(pdf_bytes), engine_name)
+    set_cached_pdf(cache_key, pdf_bytes)
+    return pdf_bytes
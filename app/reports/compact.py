@@ -5,9 +5,9 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from datetime import datetime
 import io
-from .database import get_monthly_purchases
 
-async def generate_monthly_pdf(year: int, month: int):
+def render(data: dict):
+    year, month, rows = data["year"], data["month"], data["rows"]
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.3*inch, bottomMargin=0.3*inch)
     styles = getSampleStyleSheet()
@@ -29,28 +29,20 @@ async def generate_monthly_pdf(year: int, month: int):
     story.append(Paragraph(f"🥛 MILK TRACKER - {month_names[month-1]} {year}", title_style))
     story.append(Spacer(1, 10))
     
-    purchases = await get_monthly_purchases(year, month)
-    
-    if not purchases:
+    if not rows:
         story.append(Paragraph("📭 No purchases found.", styles['Normal']))
     else:
-        total_quantity = sum(p.quantity for p in purchases)
-        total_cost = sum(p.total_cost for p in purchases)
-        
-        # Person costs
-        person_costs = {}
-        for purchase in purchases:
-            person = purchase.person
-            if person not in person_costs:
-                person_costs[person] = 0
-            person_costs[person] += purchase.total_cost
+        total_quantity = data["total_quantity"]
+        total_cost = data["total_cost"]
+        purchase_count = data["purchase_count"]
+        person_costs = data["person_costs"]
         
         # Summary table
         summary_data = [
             ['📊 SUMMARY', '', '👥 PEOPLE', ''],
             ['🥛 Total Qty', f'{total_quantity:.1f}L', 'Person', 'Cost'],
             ['💰 Total Cost', f'Rs.{total_cost:.0f}', '', ''],
-            ['📝 Purchases', str(len(purchases)), '', '']
+            ['📝 Purchases', str(purchase_count), '', '']
         ]
         
         row = 2
@@ -81,12 +73,12 @@ async def generate_monthly_pdf(year: int, month: int):
         
         # All purchases
         purchase_data = [['👤 Person', '📅 Date', '🥛 Qty', '💰 Cost']]
-        for purchase in sorted(purchases, key=lambda x: (x.person, x.date)):
+        for person, date, quantity, _, cost in sorted(rows, key=lambda x: (x[0], x[1])):
             purchase_data.append([
-                purchase.person,
-                purchase.date.strftime('%d/%m'),
-                f'{purchase.quantity:.1f}L',
-                f'Rs.{purchase.total_cost:.0f}'
+                person,
+                date.strftime('%d/%m'),
+                f'{quantity:.1f}L',
+                f'Rs.{cost:.0f}'
             ])
         
         purchase_table = Table(purchase_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1.5*inch])
@@ -117,5 +109,4 @@ async def generate_monthly_pdf(year: int, month: int):
     story.append(Paragraph(footer_text, footer_style))
     
     doc.build(story)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer.getvalue()
\ No newline at end of file
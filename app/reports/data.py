@@ -0,0 +1,17 @@
+from ..database import get_monthly_purchases, get_monthly_rollup
+
+async def load_report_data(year: int, month: int):
+    # Only plain values cross the process boundary to the render workers
+    purchases = await get_monthly_purchases(year, month)
+    rollup = await get_monthly_rollup(year, month) if purchases else None
+    return {
+        "year": year,
+        "month": month,
+        "total_quantity": rollup["total_quantity"] if rollup else 0,
+        "total_cost": rollup["total_cost"] if rollup else 0,
+        "purchase_count": rollup["purchase_count"] if rollup else 0,
+        "person_costs": rollup["person_costs"] if rollup else {},
+        "person_quantities": rollup["person_quantities"] if rollup else {},
+        "person_counts": rollup["person_counts"] if rollup else {},
+        "rows": [(p.person, p.date, p.quantity, p.price_per_liter, p.total_cost) for p in purchases]
+    }
@@ -1,15 +1,13 @@
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from datetime import datetime
 import io
-from .database import get_monthly_purchases, get_people
 
-async def generate_monthly_pdf(year: int, month: int):
+def render(data: dict):
+    year, month, rows = data["year"], data["month"], data["rows"]
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.3*inch, bottomMargin=0.3*inch)
     styles = getSampleStyleSheet()
@@ -24,6 +22,14 @@ async def generate_monthly_pdf(year: int, month: int):
         alignment=1
     )
     
+    person_header_style = ParagraphStyle(
+        'PersonHeader',
+        parent=styles['Heading2'],
+        fontSize=13,
+        spaceAfter=8,
+        textColor=colors.HexColor('#6f42c1')
+    )
+    
     story = []
     
     # Compact header
@@ -33,23 +39,20 @@ async def generate_monthly_pdf(year: int, month: int):
     story.append(Paragraph(f"🥛 MILK TRACKER - {month_names[month-1]} {year}", title_style))
     story.append(Spacer(1, 10))
     
-    # Get data
-    purchases = await get_monthly_purchases(year, month)
-    
-    if not purchases:
+    if not rows:
         story.append(Paragraph("○ No purchases found for this month.", styles['Normal']))
         story.append(Spacer(1, 20))
         story.append(Paragraph("Start tracking your milk purchases to see detailed reports here!", styles['Normal']))
     else:
         # Overall summary with icons
-        total_quantity = sum(p.quantity for p in purchases)
-        total_cost = sum(p.total_cost for p in purchases)
+        total_quantity = data["total_quantity"]
+        total_cost = data["total_cost"]
         
         summary_data = [
             ['▣ SUMMARY', ''],
             ['● Total Quantity', f'{total_quantity:.1f} Liters'],
             ['$ Total Cost', f'Rs.{total_cost:.2f}'],
-            ['# Total Purchases', str(len(purchases))],
+            ['# Total Purchases', str(data['purchase_count'])],
             ['~ Average per Day', f'{total_quantity/30:.1f}L']
         ]
         
@@ -72,16 +75,12 @@ async def generate_monthly_pdf(year: int, month: int):
         story.append(summary_table)
         story.append(Spacer(1, 30))
         
-        # Group purchases by person
+        # Group purchases by person; totals come from the rollup
         person_purchases = {}
-        person_costs = {}
-        for purchase in purchases:
-            person = purchase.person
-            if person not in person_purchases:
-                person_purchases[person] = []
-                person_costs[person] = 0
-            person_purchases[person].append(purchase)
-            person_costs[person] += purchase.total_cost
+        for row in rows:
+            person_purchases.setdefault(row[0], []).append(row)
+        person_costs = data["person_costs"]
+        person_quantities = data["person_quantities"]
         
         # Person-wise cost overview
         story.append(Paragraph("▶ COST BREAKDOWN BY PERSON", title_style))
@@ -89,7 +88,7 @@ async def generate_monthly_pdf(year: int, month: int):
         
         person_summary_data = [['Person', 'Total Cost', 'Total Quantity', 'Avg Rate']]
         for person, cost in person_costs.items():
-            person_qty = sum(p.quantity for p in person_purchases[person])
+            person_qty = person_quantities.get(person, 0)
             avg_rate = cost / person_qty if person_qty > 0 else 0
             person_summary_data.append([
                 f'● {person}', 
@@ -119,8 +118,8 @@ async def generate_monthly_pdf(year: int, month: int):
         # Detailed purchases by person
         for person, person_purchase_list in person_purchases.items():
             # Person header with stats
-            person_total = sum(p.total_cost for p in person_purchase_list)
-            person_qty = sum(p.quantity for p in person_purchase_list)
+            person_total = person_costs.get(person, 0)
+            person_qty = person_quantities.get(person, 0)
             
             story.append(Paragraph(f"🧑‍💼 {person.upper()} - DETAILED PURCHASES", person_header_style))
             
@@ -152,13 +151,13 @@ async def generate_monthly_pdf(year: int, month: int):
             
             # Person's purchase details
             purchase_data = [['Date', 'Qty (L)', 'Rate (Rs)', 'Total (Rs)', 'Time']]
-            for purchase in sorted(person_purchase_list, key=lambda x: x.date):
+            for _, date, quantity, price_per_liter, cost in sorted(person_purchase_list, key=lambda x: x[1]):
                 purchase_data.append([
-                    f'• {purchase.date.strftime("%d %b")}',
-                    f'{purchase.quantity:.1f}',
-                    f'{purchase.price_per_liter:.2f}',
-                    f'{purchase.total_cost:.2f}',
-                    purchase.date.strftime('%I:%M %p')
+                    f'• {date.strftime("%d %b")}',
+                    f'{quantity:.1f}',
+                    f'{price_per_liter:.2f}',
+                    f'{cost:.2f}',
+                    date.strftime('%I:%M %p')
                 ])
             
             purchase_table = Table(purchase_data, colWidths=[1*inch, 0.8*inch, 0.8*inch, 0.9*inch, 0.9*inch])
@@ -191,5 +190,4 @@ async def generate_monthly_pdf(year: int, month: int):
     story.append(Paragraph(footer_text, footer_style))
     
     doc.build(story)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer.getvalue()
\ No newline at end of file
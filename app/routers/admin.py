@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+
+from ..templating import templates
+from ..profiler import PROFILER_ENABLED, SLOW_QUERY_MS, slow_queries
+
+router = APIRouter()
+
+@router.get("/slow-queries", response_class=HTMLResponse)
+async def slow_queries_page(request: Request):
+    return templates.TemplateResponse("slow_queries.html", {
+        "request": request,
+        "enabled": PROFILER_ENABLED,
+        "threshold_ms": SLOW_QUERY_MS,
+        "queries": list(slow_queries)
+    })
+
+@router.post("/slow-queries/clear")
+async def clear_slow_queries():
+    slow_queries.clear()
+    return RedirectResponse(url="/admin/slow-queries", status_code=303)
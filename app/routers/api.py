@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse, Response
+from datetime import datetime, timedelta
+
+from ..database import (
+    get_daily_rollup, get_recent_purchases, get_monthly_summary, get_people,
+    get_purchase_history, encode_history_cursor, decode_history_cursor
+)
+from ..cache import get_local_version
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# ETags come from the locally synced data versions, so a 304 costs no database work
+def make_etag(*parts):
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def is_not_modified(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+def versioned_response(request: Request, etag: str):
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def json_response(content, etag: str):
+    return ORJSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def purchase_to_dict(purchase):
+    if isinstance(purchase, dict):
+        purchase_id = purchase["_id"]
+        get = purchase.get
+    else:
+        purchase_id = purchase.id
+        get = lambda name: getattr(purchase, name)
+    return {
+        "id": str(purchase_id),
+        "date": get("date"),
+        "person": get("person"),
+        "quantity": get("quantity"),
+        "price_per_liter": get("price_per_liter"),
+        "total_cost": get("total_cost")
+    }
+
+@router.get("/today")
+async def today_summary(request: Request):
+    today = datetime.now()
+    etag = make_etag("today", today.strftime("%Y%m%d"), get_local_version(f"purchases:{today.year}-{today.month:02d}"))
+    not_modified = versioned_response(request, etag)
+    if not_modified:
+        return not_modified
+    
+    summary = await get_daily_rollup(today)
+    return json_response({"date": today.strftime("%Y-%m-%d"), **summary}, etag)
+
+@router.get("/purchases/recent")
+async def recent_purchases(request: Request, limit: int = 10):
+    limit = max(1, min(limit, 100))
+    etag = make_etag("recent", limit, get_local_version("purchases"))
+    not_modified = versioned_response(request, etag)
+    if not_modified:
+        return not_modified
+    
+    purchases = await get_recent_purchases(limit)
+    return json_response({"purchases": [purchase_to_dict(p) for p in purchases]}, etag)
+
+@router.get("/purchases/history")
+async def purchase_history(
+    request: Request,
+    cursor: str = None,
+    person: str = None,
+    start: str = None,
+    end: str = None,
+    limit: int = 20
+):
+    limit = max(1, min(limit, 100))
+    try:
+        before = decode_history_cursor(cursor) if cursor else None
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor or date")
+    
+    etag = make_etag("history", limit, cursor or "", person or "", start or "", end or "", get_local_version("purchases"))
+    not_modified = versioned_response(request, etag)
+    if not_modified:
+        return not_modified
+    
+    purchases, next_cursor = await get_purchase_history(
+        limit=limit, before=before, person=person or None, start_date=start_date, end_date=end_date
+    )
+    return json_response({
+        "purchases": [purchase_to_dict(p) for p in purchases],
+        "next_cursor": encode_history_cursor(next_cursor) if next_cursor else None
+    }, etag)
+
+@router.get("/summary/{year}/{month}")
+async def monthly_summary(request: Request, year: int, month: int):
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=404, detail="Unknown month")
+    etag = make_etag(
+        "summary",
+        year,
+        month,
+        get_local_version(f"purchases:{year}-{month:02d}"),
+        get_local_version(f"payments:{year}-{month:02d}")
+    )
+    not_modified = versioned_response(request, etag)
+    if not_modified:
+        return not_modified
+    
+    summary = await get_monthly_summary(year, month)
+    return json_response({
+        "year": year,
+        "month": month,
+        "total_quantity": summary["total_quantity"],
+        "total_cost": summary["total_cost"],
+        "purchase_count": summary["purchase_count"],
+        "people": [
+            {
+                "name": person,
+                "quantity": summary["person_quantities"][person],
+                "total_cost": cost,
+                "paid": summary["payment_statuses"].get(person, False)
+            }
+            for person, cost in summary["person_costs"].items()
+        ],
+        "daily": [
+            {"day": day, "person": person, "quantity": cell["quantity"], "total_cost": cell["cost"]}
+            for day, people in summary["daily"].items()
+            for person, cell in people.items()
+        ],
+        "purchases": [purchase_to_dict(p) for p in summary["purchases"]]
+    }, etag)
+
+@router.get("/analytics/{year}")
+async def yearly_analytics(request: Request, year: int):
+    etag = make_etag("analytics", year, get_local_version("purchases"))
+    not_modified = versioned_response(request, etag)
+    if not_modified:
+        return not_modified
+    
+    # Imported on first use so workers do not load NumPy at startup
+    from ..analytics import get_yearly_report
+    return json_response(await get_yearly_report(year), etag)
+
+@router.get("/people")
+async def people_list(request: Request):
+    etag = make_etag("people", get_local_version("cache:people"))
+    not_modified = versioned_response(request, etag)
+    if not_modified:
+        return not_modified
+    
+    people = await get_people()
+    return json_response({
+        "people": [{"id": str(person.id), "name": person.name, "email": person.email} for person in people]
+    }, etag)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    # Metrics are per worker process; scrape each worker or run a single one behind the scraper
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,13 +1,11 @@
-from fastapi import APIRouter, Request, Form
+from fastapi import APIRouter, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from bson import ObjectId
 
-from ..database import get_people, create_person, get_database
+from ..templating import templates, is_htmx
+from ..database import get_people, create_person, update_person, delete_person, get_person_by_id
 from ..models import Person
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/", response_class=HTMLResponse)
 async def people_page(request: Request):
@@ -17,6 +15,13 @@ async def people_page(request: Request):
         "people": people
     })
 
+@router.get("/row/{person_id}", response_class=HTMLResponse)
+async def person_row(request: Request, person_id: str):
+    person = await get_person_by_id(person_id)
+    if not person:
+        raise HTTPException(status_code=404, detail="Person not found")
+    return templates.TemplateResponse("fragments/person_row.html", {"request": request, "person": person})
+
 @router.post("/", response_class=HTMLResponse)
 async def add_person(
     request: Request,
@@ -25,7 +30,15 @@ async def add_person(
 ):
     try:
         person = Person(name=name, email=email if email else None)
-        await create_person(person)
+        person_id = await create_person(person)
+        
+        if is_htmx(request):
+            # Appends just the new row; the flash message is swapped out of band
+            return templates.TemplateResponse("fragments/person_added.html", {
+                "request": request,
+                "person": await get_person_by_id(person_id),
+                "message": f"{name} added successfully!"
+            }, headers={"HX-Trigger": "people-changed"})
         
         people = await get_people()
         return templates.TemplateResponse("people.html", {
@@ -34,6 +47,11 @@ async def add_person(
             "message": f"{name} added successfully!"
         })
     except Exception as e:
+        if is_htmx(request):
+            return templates.TemplateResponse("fragments/flash.html", {
+                "request": request,
+                "error": str(e)
+            }, headers={"HX-Retarget": "#flash", "HX-Reswap": "innerHTML"})
         people = await get_people()
         return templates.TemplateResponse("people.html", {
             "request": request,
@@ -42,17 +60,16 @@ async def add_person(
         })
 
 @router.post("/delete/{person_id}")
-async def delete_person(person_id: str):
-    db = get_database()
-    await db.people.delete_one({"_id": ObjectId(person_id)})
+async def delete_person_route(request: Request, person_id: str):
+    await delete_person(person_id)
+    if is_htmx(request):
+        return HTMLResponse("")
     return RedirectResponse(url="/people", status_code=303)
 
 @router.get("/edit/{person_id}", response_class=HTMLResponse)
 async def edit_person_page(request: Request, person_id: str):
-    db = get_database()
-    person_data = await db.people.find_one({"_id": ObjectId(person_id)})
-    if person_data:
-        person = Person(**person_data)
+    person = await get_person_by_id(person_id)
+    if person:
         return templates.TemplateResponse("edit_person.html", {
             "request": request,
             "person": person
@@ -60,14 +77,10 @@ async def edit_person_page(request: Request, person_id: str):
     return RedirectResponse(url="/people", status_code=303)
 
 @router.post("/edit/{person_id}")
-async def update_person(
+async def update_person_route(
     person_id: str,
     name: str = Form(...),
     email: str = Form(None)
 ):
-    db = get_database()
-    await db.people.update_one(
-        {"_id": ObjectId(person_id)},
-        {"$set": {"name": name, "email": email if email else None}}
-    )
+    await update_person(person_id, name, email if email else None)
     return RedirectResponse(url="/people", status_code=303)
\ No newline at end of file
@@ -1,36 +1,73 @@
-from fastapi import APIRouter, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from datetime import datetime
+from fastapi import APIRouter, Request, Form, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+import csv
+import io
+import math
 
+from ..templating import templates, is_htmx
 from ..database import (
-    get_daily_purchases, get_recent_purchases, create_purchase, 
+    get_daily_rollup, get_recent_purchases, create_purchase, create_purchases, get_person_by_name,
     get_people, get_milk_rate, get_purchase_by_id, update_purchase, delete_purchase,
-    update_milk_rate
+    update_milk_rate, get_purchase_history, encode_history_cursor, decode_history_cursor
 )
 from ..models import PurchaseCreate
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     today = datetime.now()
-    daily_purchases = await get_daily_purchases(today)
+    daily_summary = await get_daily_rollup(today)
     recent_purchases = await get_recent_purchases(10)
     
-    daily_summary = {
-        "total_quantity": sum(p.quantity for p in daily_purchases),
-        "total_cost": sum(p.total_cost for p in daily_purchases),
-        "purchases": daily_purchases
-    }
-    
     return templates.TemplateResponse("index.html", {
         "request": request,
         "daily_summary": daily_summary,
         "recent_purchases": recent_purchases
     })
 
+@router.get("/fragments/today", response_class=HTMLResponse)
+async def today_card(request: Request):
+    return templates.TemplateResponse("fragments/today_card.html", {
+        "request": request,
+        "daily_summary": await get_daily_rollup(datetime.now())
+    })
+
+@router.get("/history", response_class=HTMLResponse)
+async def purchase_history(
+    request: Request,
+    cursor: str = None,
+    person: str = None,
+    start: str = None,
+    end: str = None
+):
+    try:
+        before = decode_history_cursor(cursor) if cursor else None
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        # The end date is inclusive in the form
+        end_date = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor or date")
+    
+    purchases, next_cursor = await get_purchase_history(
+        limit=20, before=before, person=person or None, start_date=start_date, end_date=end_date
+    )
+    filters = {key: value for key, value in {"person": person, "start": start, "end": end}.items() if value}
+    next_url = None
+    if next_cursor:
+        next_url = "/history?" + urlencode({**filters, "cursor": encode_history_cursor(next_cursor)})
+    
+    return templates.TemplateResponse("history.html", {
+        "request": request,
+        "purchases": purchases,
+        "people": await get_people(),
+        "filters": filters,
+        "next_url": next_url,
+        "is_first_page": cursor is None
+    })
+
 @router.get("/add", response_class=HTMLResponse)
 async def add_purchase_form(request: Request):
     people = await get_people()
@@ -38,7 +75,8 @@ async def add_purchase_form(request: Request):
     return templates.TemplateResponse("add_purchase.html", {
         "request": request,
         "people": people,
-        "milk_rate": milk_rate
+        "milk_rate": milk_rate,
+        "daily_summary": await get_daily_rollup(datetime.now())
     })
 
 @router.post("/add", response_class=HTMLResponse)
@@ -63,24 +101,112 @@ async def add_purchase(
         
         await create_purchase(purchase_data)
         
+        if is_htmx(request):
+            # The today card refreshes itself on this event
+            return templates.TemplateResponse("fragments/flash.html", {
+                "request": request,
+                "message": "Purchase added successfully!"
+            }, headers={"HX-Trigger": "purchases-changed"})
+        
         people_list = await get_people()
         milk_rate = await get_milk_rate()
         return templates.TemplateResponse("add_purchase.html", {
             "request": request,
             "people": people_list,
             "milk_rate": milk_rate,
+            "daily_summary": await get_daily_rollup(datetime.now()),
             "message": "Purchase added successfully!"
         })
     except Exception as e:
+        if is_htmx(request):
+            return templates.TemplateResponse("fragments/flash.html", {"request": request, "error": str(e)})
         people_list = await get_people()
         milk_rate = await get_milk_rate()
         return templates.TemplateResponse("add_purchase.html", {
             "request": request,
             "people": people_list,
             "milk_rate": milk_rate,
+            "daily_summary": await get_daily_rollup(datetime.now()),
             "error": str(e)
         })
 
+MAX_BATCH_ROWS = 5000
+
+def parse_batch_row(row: dict):
+    person = row.get("person") or ""
+    if not isinstance(person, str):
+        raise ValueError("person must be a string")
+    person = person.strip()
+    if not person:
+        raise ValueError("person is required")
+    # float() accepts "nan" and "inf", which would poison the rollup sums
+    quantity = float(row.get("quantity"))
+    if not math.isfinite(quantity) or quantity <= 0:
+        raise ValueError("quantity must be a positive number")
+    price = row.get("price_per_liter")
+    if price not in (None, ""):
+        price = float(price)
+        if not math.isfinite(price) or price < 0:
+            raise ValueError("price_per_liter must be a non-negative number")
+    date = row.get("date")
+    return PurchaseCreate(
+        person=person,
+        quantity=quantity,
+        price_per_liter=price if price not in (None, "") else None,
+        date=datetime.strptime(date, "%Y-%m-%d") if date else None
+    )
+
+@router.post("/add/batch")
+async def add_purchases_batch(request: Request):
+    # JSON: {"rows": [{"person", "date", "quantity", "price_per_liter"}]}
+    # multipart: a CSV "file" with the same columns
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Upload a CSV file in the 'file' field")
+        try:
+            rows = list(csv.DictReader(io.StringIO((await upload.read()).decode("utf-8-sig"))))
+        except (UnicodeDecodeError, csv.Error):
+            raise HTTPException(status_code=400, detail="The CSV file must be UTF-8 text")
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON or a multipart CSV upload")
+        rows = payload.get("rows") if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a list of rows")
+    if len(rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+    
+    results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("row must be an object")
+            purchase_data = parse_batch_row(row)
+            if await get_person_by_name(purchase_data.person) is None:
+                raise ValueError(f"unknown person '{purchase_data.person}'")
+            valid.append((index, purchase_data))
+        except (TypeError, ValueError) as e:
+            results[index] = {"row": index, "status": "error", "error": str(e)}
+    
+    created = await create_purchases([purchase_data for _, purchase_data in valid])
+    for (index, _), outcome in zip(valid, created):
+        if outcome["error"]:
+            results[index] = {"row": index, "status": "error", "error": outcome["error"]}
+        else:
+            results[index] = {"row": index, "status": "created", "id": outcome["id"]}
+    
+    created_count = sum(1 for result in results if result["status"] == "created")
+    return JSONResponse({
+        "created": created_count,
+        "failed": len(results) - created_count,
+        "results": results
+    })
+
 @router.get("/edit/{purchase_id}", response_class=HTMLResponse)
 async def edit_purchase_form(request: Request, purchase_id: str):
     purchase = await get_purchase_by_id(purchase_id)
@@ -132,11 +258,20 @@ async def edit_purchase(
         })
 
 @router.post("/delete/{purchase_id}")
-async def delete_purchase_route(purchase_id: str):
+async def delete_purchase_route(request: Request, purchase_id: str):
     await delete_purchase(purchase_id)
+    if is_htmx(request):
+        # Removes the row in place and refreshes the today card
+        return HTMLResponse("", headers={"HX-Trigger": "purchases-changed"})
     return RedirectResponse(url="/", status_code=303)
 
 @router.post("/settings")
-async def update_settings(milk_rate: float = Form(...)):
+async def update_settings(request: Request, milk_rate: float = Form(...)):
     await update_milk_rate(milk_rate)
+    if is_htmx(request):
+        return templates.TemplateResponse("fragments/rate_updated.html", {
+            "request": request,
+            "milk_rate": milk_rate,
+            "message": "Milk rate updated successfully!"
+        })
     return RedirectResponse(url="/add", status_code=303)
\ No newline at end of file
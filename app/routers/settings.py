@@ -1,11 +1,10 @@
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 
+from ..templating import templates, is_htmx
 from ..database import get_milk_rate, update_milk_rate
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/", response_class=HTMLResponse)
 async def settings_page(request: Request):
@@ -22,6 +21,11 @@ async def update_milk_rate_route(
 ):
     try:
         await update_milk_rate(milk_rate)
+        if is_htmx(request):
+            return templates.TemplateResponse("fragments/flash.html", {
+                "request": request,
+                "message": "Milk rate updated successfully!"
+            })
         return templates.TemplateResponse("settings.html", {
             "request": request,
             "milk_rate": milk_rate,
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Request, Form
+from fastapi.responses import HTMLResponse, RedirectResponse
+from datetime import datetime
+from typing import List
+
+from ..templating import templates
+from ..database import (
+    get_people, get_milk_rate, get_standing_orders, create_standing_order,
+    delete_standing_order, materialize_upcoming_standing_orders
+)
+from ..models import StandingOrder
+
+router = APIRouter()
+
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+async def render_standing_orders(request: Request, message: str = None, error: str = None):
+    return templates.TemplateResponse("standing_orders.html", {
+        "request": request,
+        "orders": await get_standing_orders(),
+        "people": await get_people(),
+        "milk_rate": await get_milk_rate(),
+        "weekday_names": WEEKDAY_NAMES,
+        "message": message,
+        "error": error
+    })
+
+@router.get("/", response_class=HTMLResponse)
+async def standing_orders_page(request: Request):
+    return await render_standing_orders(request)
+
+@router.post("/", response_class=HTMLResponse)
+async def add_standing_order(
+    request: Request,
+    person: str = Form(...),
+    quantity: float = Form(...),
+    price_per_liter: float = Form(None),
+    weekdays: List[int] = Form([]),
+    start_date: str = Form(None)
+):
+    try:
+        order = StandingOrder(
+            person=person,
+            quantity=quantity,
+            price_per_liter=price_per_liter,
+            weekdays=weekdays or list(range(7)),
+            start_date=datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        )
+        await create_standing_order(order)
+        created = await materialize_upcoming_standing_orders()
+        return await render_standing_orders(
+            request, message=f"Standing order added for {person}; {created} upcoming deliveries scheduled"
+        )
+    except Exception as e:
+        return await render_standing_orders(request, error=str(e))
+
+@router.post("/delete/{order_id}")
+async def delete_standing_order_route(order_id: str):
+    await delete_standing_order(order_id)
+    return RedirectResponse(url="/standing-orders", status_code=303)
+
+@router.post("/generate", response_class=HTMLResponse)
+async def generate_standing_orders(request: Request):
+    created = await materialize_upcoming_standing_orders()
+    return await render_standing_orders(request, message=f"{created} upcoming deliveries scheduled")
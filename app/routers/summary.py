@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import HTMLResponse, Response, RedirectResponse, StreamingResponse
 import calendar
+import csv
+import io
+import json
 from datetime import datetime
 
-from ..database import get_available_months, get_monthly_purchases, get_database
-from ..pdf_service_new import generate_monthly_pdf
+from ..templating import templates, is_htmx
+from ..database import (
+    get_available_months, get_monthly_summary, get_database, stream_purchases, bump_version, record_changes,
+    payment_change
+)
+from ..cache import get_local_version
+from ..reports import REPORT_ENGINES, DEFAULT_REPORT_ENGINE, generate_monthly_pdf
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/", response_class=HTMLResponse)
 async def summary_page(request: Request, month_year: str = None):
@@ -41,74 +49,38 @@ async def summary_page(request: Request, month_year: str = None):
         selected_month = available_months[0]["month"]
         selected_year = available_months[0]["year"]
     
-    monthly_purchases = await get_monthly_purchases(selected_year, selected_month)
-    
-    total_quantity = sum(p.quantity for p in monthly_purchases)
-    total_cost = sum(p.total_cost for p in monthly_purchases)
-    
-    # Calculate cost per person
-    person_costs = {}
-    person_quantities = {}
-    for purchase in monthly_purchases:
-        person = purchase.person
-        cost = purchase.total_cost
-        quantity = purchase.quantity
-        if person:
-            if person not in person_costs:
-                person_costs[person] = 0
-                person_quantities[person] = 0
-            person_costs[person] += cost
-            person_quantities[person] += quantity
-    
-    # Get payment status for each person
-    db = get_database()
-    payment_statuses = {}
-    for person in person_costs.keys():
-        status = await db.payment_status.find_one({
-            "person": person,
-            "month": selected_month,
-            "year": selected_year
-        })
-        payment_statuses[person] = status.get("paid", False) if status else False
+    # Totals, per-person sums, calendar cells and payment status in one round trip
+    summary = await get_monthly_summary(selected_year, selected_month)
+    
+    monthly_purchases = summary["purchases"]
+    total_quantity = summary["total_quantity"]
+    total_cost = summary["total_cost"]
+    person_costs = summary["person_costs"]
+    person_quantities = summary["person_quantities"]
+    payment_statuses = summary["payment_statuses"]
     
     # Generate calendar data
-    calendar_data = generate_calendar_data(selected_year, selected_month, monthly_purchases)
+    calendar_data = generate_calendar_data(selected_year, selected_month, summary["daily"])
     
     return templates.TemplateResponse("summary.html", {
         "request": request,
         "monthly_purchases": monthly_purchases,
         "total_quantity": total_quantity,
         "total_cost": total_cost,
+        "purchase_count": summary["purchase_count"],
         "person_costs": person_costs,
         "person_quantities": person_quantities,
         "payment_statuses": payment_statuses,
         "available_months": available_months,
         "selected_month": selected_month,
         "selected_year": selected_year,
-        "calendar_data": calendar_data
+        "calendar_data": calendar_data,
+        "data_version": get_local_version(f"purchases:{selected_year}-{selected_month:02d}")
     })
 
-def generate_calendar_data(year: int, month: int, purchases: list):
+def generate_calendar_data(year: int, month: int, daily_purchases: dict):
     cal = calendar.monthcalendar(year, month)
     
-    # Group purchases by date and person
-    daily_purchases = {}
-    for purchase in purchases:
-        date = purchase.date
-        if date:
-            day = date.day
-            person = purchase.person
-            quantity = purchase.quantity
-            cost = purchase.total_cost
-            
-            if day not in daily_purchases:
-                daily_purchases[day] = {}
-            if person not in daily_purchases[day]:
-                daily_purchases[day][person] = {'quantity': 0, 'cost': 0}
-            
-            daily_purchases[day][person]['quantity'] += quantity
-            daily_purchases[day][person]['cost'] += cost
-    
     # Build calendar structure
     calendar_weeks = []
     for week in cal:
@@ -131,8 +103,31 @@ def generate_calendar_data(year: int, month: int, purchases: list):
     
     return calendar_weeks
 
+@router.get("/yearly", response_class=HTMLResponse)
+async def yearly_report_page(request: Request, year: int = None):
+    available_months = await get_available_months()
+    years = sorted({month_data["year"] for month_data in available_months}, reverse=True)
+    if year is None:
+        year = years[0] if years else datetime.now().year
+    
+    # Imported on first use so workers do not load NumPy at startup
+    from ..analytics import get_yearly_report
+    report = await get_yearly_report(year)
+    return templates.TemplateResponse("yearly.html", {
+        "request": request,
+        "years": years,
+        "selected_year": year,
+        "report": report,
+        "max_monthly_cost": max((month["total_cost"] for month in report["months"]), default=0),
+        "max_weekday_quantity": max((day["quantity"] for day in report["weekdays"]), default=0),
+        "max_rolling_quantity": max(report["rolling_quantity"], default=0)
+    })
+
 @router.get("/download-pdf")
-async def download_monthly_pdf(month_year: str = None):
+async def download_monthly_pdf(month_year: str = None, engine: str = DEFAULT_REPORT_ENGINE):
+    if engine not in REPORT_ENGINES:
+        raise HTTPException(status_code=404, detail=f"Unknown report engine '{engine}'")
+    
     if month_year:
         try:
             month, year = map(int, month_year.split('-'))
@@ -145,38 +140,132 @@ async def download_monthly_pdf(month_year: str = None):
         now = datetime.now()
         month, year = now.month, now.year
     
-    pdf_buffer = await generate_monthly_pdf(year, month)
+    pdf_bytes = await generate_monthly_pdf(year, month, engine)
     
-    filename = f"milk_summary_{year}_{month:02d}.pdf"
+    filename = f"milk_summary_{year}_{month:02d}.pdf" if engine == DEFAULT_REPORT_ENGINE else f"milk_summary_{year}_{month:02d}_{engine}.pdf"
     
-    return StreamingResponse(
-        pdf_buffer,
+    return Response(
+        pdf_bytes,
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
-@router.post("/toggle-payment/{person}/{month}/{year}")
-async def toggle_payment(person: str, month: int, year: int):
-    db = get_database()
-    status = await db.payment_status.find_one({
+EXPORT_FIELDS = ['id', 'date', 'person', 'quantity', 'price_per_liter', 'total_cost']
+EXPORT_CHUNK_ROWS = 500
+
+async def export_csv_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    async for row in rows:
+        writer.writerow([
+            row['id'],
+            row['date'].strftime('%Y-%m-%d %H:%M:%S'),
+            row['person'],
+            row['quantity'],
+            row['price_per_liter'],
+            row['total_cost']
+        ])
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def export_ndjson_rows(rows):
+    chunk = []
+    async for row in rows:
+        row['date'] = row['date'].isoformat()
+        chunk.append(json.dumps(row, ensure_ascii=False))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+@router.get("/export")
+async def export_purchases(
+    format: str = "csv",
+    year: int = None,
+    start: str = None,
+    end: str = None
+):
+    # No range means all history; end is exclusive
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if year:
+        start_date = datetime(year, 1, 1)
+        end_date = datetime(year + 1, 1, 1)
+    
+    rows = stream_purchases(start_date, end_date)
+    if year:
+        label = str(year)
+    elif start_date or end_date:
+        label = f"{start or 'start'}_{end or 'end'}"
+    else:
+        label = "all"
+    
+    if format == "csv":
+        return StreamingResponse(
+            export_csv_rows(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=milk_purchases_{label}.csv"}
+        )
+    if format == "ndjson":
+        return StreamingResponse(
+            export_ndjson_rows(rows),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename=milk_purchases_{label}.ndjson"}
+        )
+    raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+def render_payment_badge(request: Request, person: str, month: int, year: int, paid: bool):
+    return templates.TemplateResponse("fragments/payment_badge.html", {
+        "request": request,
         "person": person,
         "month": month,
-        "year": year
+        "year": year,
+        "paid": paid
     })
+
+@router.get("/payment-badge/{person}/{month}/{year}", response_class=HTMLResponse)
+async def payment_badge(request: Request, person: str, month: int, year: int):
+    status = await get_database().payment_status.find_one({"person": person, "year": year, "month": month})
+    return render_payment_badge(request, person, month, year, bool(status and status.get("paid")))
+
+@router.post("/toggle-payment/{person}/{month}/{year}")
+async def toggle_payment(request: Request, person: str, month: int, year: int):
+    db = get_database()
+    key = {"person": person, "year": year, "month": month}
+    while True:
+        status = await db.payment_status.find_one(key)
+        new_paid = not (status or {}).get("paid", False)
+        # Compare-and-set on rev so two racing toggles cannot both flip from the same state; the unique
+        # (person, year, month) key turns a racing first insert into a DuplicateKeyError and another pass
+        if status is None:
+            match = {**key, "rev": {"$exists": False}}
+        else:
+            match = {"_id": status["_id"], "rev": status["rev"] if "rev" in status else {"$exists": False}}
+        try:
+            stored = await db.payment_status.find_one_and_update(
+                match,
+                {"$set": {"paid": new_paid, "paid_date": datetime.now() if new_paid else None}, "$inc": {"rev": 1}},
+                upsert=status is None,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            continue
+        if stored:
+            break
+    await bump_version(f"payments:{year}-{month:02d}")
+    await record_changes([payment_change(stored)])
     
-    if status:
-        new_paid = not status.get("paid", False)
-        await db.payment_status.update_one(
-            {"_id": status["_id"]},
-            {"$set": {"paid": new_paid, "paid_date": datetime.now() if new_paid else None}}
-        )
-    else:
-        await db.payment_status.insert_one({
-            "person": person,
-            "month": month,
-            "year": year,
-            "paid": True,
-            "paid_date": datetime.now()
-        })
-    
+    if is_htmx(request):
+        # Swap just this badge instead of re-running the whole summary
+        return render_payment_badge(request, person, month, year, new_paid)
     return RedirectResponse(url=f"/summary?month_year={month}-{year}", status_code=303)
\ No newline at end of file
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+
+from ..database import get_changes_since, get_sync_snapshot
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+def sync_response(content: dict):
+    return ORJSONResponse(content, headers={"Cache-Control": "no-store"})
+
+@router.get("/sync")
+async def sync(since: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000), snapshot: str = None):
+    # Clients keep a local replica and pass back `next` as `since`. `reset` means drop the replica and
+    # apply the snapshot, passing `snapshot` back until it comes back null, then continue from `next`.
+    if snapshot:
+        try:
+            page = await get_sync_snapshot(snapshot, limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid snapshot cursor")
+        return sync_response({"reset": False, "more": page["snapshot"] is not None, **page})
+    if since > 0:
+        delta = await get_changes_since(since, limit)
+        if delta is not None:
+            return sync_response({"reset": False, "snapshot": None, **delta})
+    page = await get_sync_snapshot(limit=limit)
+    return sync_response({"reset": True, "more": page["snapshot"] is not None, **page})
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .database import get_database
+
+scheduler = AsyncIOScheduler()
+
+# Identifies this worker process across all nodes
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+DEFAULT_LEASE_TTL = 600  # seconds
+
+async def acquire_lease(name: str, ttl: int = DEFAULT_LEASE_TTL):
+    database = get_database()
+    now = datetime.utcnow()
+    try:
+        lease = await database.job_leases.find_one_and_update(
+            {"_id": name, "expires_at": {"$lte": now}},
+            {
+                "$set": {"owner": OWNER_ID, "acquired_at": now, "expires_at": now + timedelta(seconds=ttl)},
+                "$inc": {"token": 1}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another process holds an unexpired lease
+        return None
+    return lease["token"]
+
+async def release_lease(name: str, token: int):
+    database = get_database()
+    await database.job_leases.update_one(
+        {"_id": name, "owner": OWNER_ID, "token": token},
+        {"$set": {"expires_at": datetime.utcnow()}}
+    )
+
+class LeaseLost(Exception):
+    pass
+
+class Lease:
+    """A held lease, kept alive by heartbeat() while its holder works"""
+    
+    def __init__(self, name: str, token: int, ttl: int):
+        self.name = name
+        self.token = token
+        self.ttl = ttl
+        # Counted locally from before each renewal request, so this worker gives up before the database expires it
+        self._deadline = time.monotonic() + ttl
+        # Set from the event loop, read by SMTP worker threads
+        self._lost = threading.Event()
+    
+    @property
+    def held(self):
+        return not self._lost.is_set() and time.monotonic() < self._deadline
+    
+    async def renew(self):
+        deadline = time.monotonic() + self.ttl
+        now = datetime.utcnow()
+        result = await get_database().job_leases.update_one(
+            {"_id": self.name, "owner": OWNER_ID, "token": self.token, "expires_at": {"$gt": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}}
+        )
+        if result.matched_count:
+            self._deadline = deadline
+        else:
+            self._lost.set()
+        return self.held
+    
+    async def heartbeat(self):
+        while self.held:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.renew()
+            except Exception as e:
+                print(f"Failed to renew lease {self.name}: {str(e)}")
+        print(f"Lost lease {self.name}; another worker may take over")
+
+# The lease of the job running in this context; asyncio.to_thread carries it into worker threads
+current_lease = ContextVar("current_lease", default=None)
+
+def check_lease():
+    """Raise LeaseLost before a side effect if the running job no longer holds its lease"""
+    lease = current_lease.get()
+    if lease is not None and not lease.held:
+        raise LeaseLost(f"Lease {lease.name} expired before the job finished")
+
+@asynccontextmanager
+async def hold_lease(name: str, ttl: int = DEFAULT_LEASE_TTL):
+    """Yields a renewed Lease for the duration of the block, or None when another worker holds it"""
+    token = await acquire_lease(name, ttl)
+    if token is None:
+        yield None
+        return
+    lease = Lease(name, token, ttl)
+    heartbeat = asyncio.create_task(lease.heartbeat())
+    context_token = current_lease.set(lease)
+    try:
+        yield lease
+    finally:
+        current_lease.reset(context_token)
+        heartbeat.cancel()
+        await release_lease(name, token)
+
+def singleton_job(name: str, func, slot_format: str, lease_ttl: int = DEFAULT_LEASE_TTL):
+    """Wrap func so each slot (e.g. "%Y-%m" for a monthly job) runs once across all workers"""
+    
+    async def run():
+        slot = datetime.now().strftime(slot_format)
+        async with hold_lease(name, lease_ttl) as lease:
+            if lease is None:
+                return
+            
+            database = get_database()
+            if await database.job_runs.find_one({"job": name, "slot": slot, "status": "succeeded"}):
+                return
+            
+            run_id = (await database.job_runs.insert_one({
+                "job": name,
+                "slot": slot,
+                "owner": OWNER_ID,
+                "token": lease.token,
+                "status": "running",
+                "started_at": datetime.utcnow()
+            })).inserted_id
+            
+            status, error = "succeeded", None
+            try:
+                await func()
+                # A run that outlived its lease may overlap the worker that took over; never mark it done
+                check_lease()
+            except Exception as e:
+                status, error = "failed", str(e) or type(e).__name__
+                print(f"Scheduled job {name} failed: {error}")
+            
+            await database.job_runs.update_one(
+                {"_id": run_id, "token": lease.token},
+                {"$set": {"status": status, "error": error, "finished_at": datetime.utcnow()}}
+            )
+    
+    run.__name__ = name
+    return run
@@ -0,0 +1,8 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Month and year pickers submit their form as soon as a value is chosen
+    document.querySelectorAll('select[data-autosubmit]').forEach(function(select) {
+        select.addEventListener('change', function() {
+            this.form.submit();
+        });
+    });
+});
@@ -1,21 +1,129 @@
+import gzip
+import hashlib
+import json
+import mimetypes
 import os
+import shutil
+import stat
+import anyio
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Build output; everything in here is content-addressed and never changes in place
+DIST_DIR = "dist"
+MANIFEST_PATH = os.path.join(STATIC_DIR, DIST_DIR, "manifest.json")
+ASSET_EXTENSIONS = (".css", ".js")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+def _fingerprint(path: str, content: bytes):
+    base, extension = os.path.splitext(path)
+    return f"{base}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+
+def build_assets():
+    """Content-hash every CSS/JS file into static/dist and write .gz/.br siblings plus a manifest"""
+    dist = os.path.join(STATIC_DIR, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [name for name in dirs if os.path.join(root, name) != dist]
+        for name in files:
+            if not name.endswith(ASSET_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            path = os.path.relpath(source, STATIC_DIR).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                content = f.read()
+            hashed = _fingerprint(path, content)
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(content)
+            # mtime=0 keeps the gzip output byte-identical across builds
+            with open(target + ".gz", "wb") as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + ".br", "wb") as f:
+                    f.write(brotli.compress(content, quality=11))
+            manifest[path] = f"{DIST_DIR}/{hashed}"
+    os.makedirs(dist, exist_ok=True)
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # No build step run (local development): serve the source files
+        return {}
+
+_manifest = _load_manifest()
+
+def static_url(path: str):
+    """Template helper: the fingerprinted URL for a static file when built, else its plain URL"""
+    return f"/static/{_manifest.get(path, path)}"
+
+def _accepted_encodings(scope):
+    accept = Headers(scope=scope).get("accept-encoding", "")
+    encodings = set()
+    for part in accept.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Serves build output from its .br/.gz siblings with immutable caching; source files revalidate"""
+
+    async def get_response(self, path: str, scope):
+        if not path.startswith(DIST_DIR + "/"):
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        response = None
+        encodings = _accepted_encodings(scope)
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in encodings:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                response = FileResponse(
+                    full_path,
+                    stat_result=stat_result,
+                    method=scope["method"],
+                    media_type=mimetypes.guess_type(path)[0],
+                    headers={"Content-Encoding": encoding}
+                )
+                break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
 
 def setup_static_files(app: FastAPI):
     """Setup static files for production deployment"""
-    
-    # Get the directory where this file is located
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Static files path
-    static_dir = os.path.join(current_dir, "static")
-    
+
     # Check if static directory exists
-    if os.path.exists(static_dir):
-        app.mount("/static", StaticFiles(directory=static_dir), name="static")
-        print(f"Static files mounted from: {static_dir}")
+    if os.path.exists(STATIC_DIR):
+        app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
+        print(f"Static files mounted from: {STATIC_DIR} ({len(_manifest)} fingerprinted assets)")
     else:
-        print(f"Warning: Static directory not found at {static_dir}")
-        
-    return static_dir
\ No newline at end of file
+        print(f"Warning: Static directory not found at {STATIC_DIR}")
+
+    return STATIC_DIR
+
+if __name__ == "__main__":
+    # Run at image build time: python -m app.static_config
+    built = build_assets()
+    print(f"Fingerprinted and precompressed {len(built)} static assets")
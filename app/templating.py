@@ -0,0 +1,66 @@
+import os
+import time
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from .cache import get_cache
+from .metrics import template_render_duration
+from .static_config import static_url
+
+TEMPLATE_DIR = "app/templates"
+# Compiled templates survive restarts and are shared by every worker
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
+
+class FragmentCacheExtension(Extension):
+    """{% cache key %}...{% endcache %} stores the rendered block in the fragments cache.
+
+    Keys should include a data version so stale fragments are never looked up again.
+    """
+    tags = {"cache"}
+    
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render_cached", [key]), [], [], body).set_lineno(lineno)
+    
+    def _render_cached(self, key, caller):
+        cache = get_cache("fragments")
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = caller()
+            cache.set(key, rendered)
+        return rendered
+
+class InstrumentedTemplates(Jinja2Templates):
+    def TemplateResponse(self, name: str, *args, **kwargs):
+        # The response renders the template when it is built
+        started = time.perf_counter()
+        response = super().TemplateResponse(name, *args, **kwargs)
+        template_render_duration.observe(time.perf_counter() - started, name)
+        return response
+
+def create_templates():
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    templates = InstrumentedTemplates(directory=TEMPLATE_DIR)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    templates.env.add_extension(FragmentCacheExtension)
+    templates.env.globals["static_url"] = static_url
+    return templates
+
+templates = create_templates()
+
+def is_htmx(request):
+    # htmx swaps only the changed fragment; plain form posts still get the full page
+    return request.headers.get("HX-Request") == "true"
+
+def precompile_templates():
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return names
+
+if __name__ == "__main__":
+    # Run at image build time: python -m app.templating
+    compiled = precompile_templates()
+    print(f"Precompiled {len(compiled)} templates into {TEMPLATE_CACHE_DIR}")
@@ -0,0 +1,76 @@
+"""
+Compare the vectorized yearly report against per-object Python loops over a year of purchases
+Usage: python benchmarks/bench_analytics.py [people]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from bson import ObjectId
+from app.analytics import PurchaseColumns, compute_yearly_report
+from app.models import PurchaseRow
+from synthetic_data import generate_people, generate_purchases
+
+YEAR = 2024
+
+def to_columns(purchases: list, start: datetime, end: datetime, people: list):
+    codes = {name: code for code, name in enumerate(people)}
+    return PurchaseColumns(
+        start,
+        (end - start).days,
+        np.array([(p["date"] - start).days for p in purchases], dtype=np.int32),
+        np.array([codes[p["person"]] for p in purchases], dtype=np.int32),
+        people,
+        np.array([p["quantity"] for p in purchases]),
+        np.array([p["price_per_liter"] for p in purchases]),
+        np.array([p["total_cost"] for p in purchases])
+    )
+
+def loop_report(rows: list, start: datetime, days: int):
+    # The shape of the per-month code: attribute lookups and dict updates per purchase
+    person_costs, person_quantities, weighted = {}, {}, {}
+    daily = [0.0] * days
+    monthly = [0.0] * 12
+    for row in rows:
+        person_costs[row.person] = person_costs.get(row.person, 0) + row.total_cost
+        person_quantities[row.person] = person_quantities.get(row.person, 0) + row.quantity
+        weighted[row.person] = weighted.get(row.person, 0) + row.price_per_liter * row.quantity
+        daily[(row.date - start).days] += row.quantity
+        monthly[row.date.month - 1] += row.total_cost
+    weekday_totals, weekday_counts = [0.0] * 7, [0] * 7
+    for day, quantity in enumerate(daily):
+        weekday = (start.weekday() + day) % 7
+        weekday_totals[weekday] += quantity
+        weekday_counts[weekday] += 1
+    rolling = [sum(daily[max(0, day - 6):day + 1]) / min(day + 1, 7) for day in range(days)]
+    return person_costs, weighted, monthly, weekday_totals, rolling
+
+def main():
+    people = generate_people(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
+    start, end = datetime(YEAR, 1, 1), datetime(YEAR + 1, 1, 1)
+    purchases = list(generate_purchases(people, years=2, legacy_share=0, end_date=end))
+    current = [p for p in purchases if p["date"] >= start]
+    previous = [p for p in purchases if p["date"] < start]
+    names = [person["name"] for person in people]
+    print(f"{len(current)} purchases in {YEAR} for {len(people)} people")
+
+    rows = [PurchaseRow.from_document({"_id": ObjectId(), **p}) for p in current]
+    started = time.perf_counter()
+    loop_report(rows, start, (end - start).days)
+    loop_ms = (time.perf_counter() - started) * 1000
+
+    current_columns = to_columns(current, start, end, names)
+    previous_columns = to_columns(previous, datetime(YEAR - 1, 1, 1), start, names)
+    started = time.perf_counter()
+    compute_yearly_report(YEAR, current_columns, previous_columns, today=end)
+    numpy_ms = (time.perf_counter() - started) * 1000
+
+    print(f"Python loops    {loop_ms:8.1f} ms")
+    print(f"NumPy report    {numpy_ms:8.1f} ms  ({loop_ms / numpy_ms:.0f}x faster, with year-over-year included)")
+
+if __name__ == "__main__":
+    main()
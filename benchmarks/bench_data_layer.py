@@ -0,0 +1,254 @@
+"""
+Benchmark the data layer against a seeded synthetic history
+Reports median/p95 latency, peak Python allocations and MongoDB round trips per function
+Usage:
+    python benchmarks/bench_data_layer.py                  # in-memory stand-in (pip install mongomock-motor)
+    python benchmarks/bench_data_layer.py --mongod         # throwaway local mongod on a temp dbpath
+    python benchmarks/bench_data_layer.py --url mongodb://localhost:27017 --database milk_bench
+    python benchmarks/bench_data_layer.py --save           # write the baseline
+    python benchmarks/bench_data_layer.py --compare        # exit 1 on a regression against the baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from pymongo import monitoring
+
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+
+class RoundTripCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+round_trips = RoundTripCounter()
+# Registered before any client exists so every client reports to it; the in-memory stand-in sends none
+monitoring.register(round_trips)
+
+def start_mongod():
+    if not shutil.which("mongod"):
+        sys.exit("mongod is not on PATH")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    dbpath = tempfile.mkdtemp(prefix="milk-bench-")
+    process = subprocess.Popen(
+        ["mongod", "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return process, dbpath, f"mongodb://127.0.0.1:{port}"
+
+def stop_mongod(process, dbpath):
+    process.terminate()
+    process.wait()
+    shutil.rmtree(dbpath, ignore_errors=True)
+
+async def connect(url: str):
+    import app.database as database
+    if url:
+        os.environ["MONGODB_URL"] = url
+        await database.connect_to_mongo()
+        return "mongod"
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("The in-memory stand-in needs mongomock-motor; pass --url or --mongod for a real server")
+    database.db.client = AsyncMongoMockClient()
+    return "memory"
+
+def clear_caches():
+    from app.cache import get_cache
+    # Every run measures the uncached path
+    for namespace in ("summary", "pdf", "fragments", "available_months"):
+        get_cache(namespace).clear()
+
+def make_request(path: str):
+    from starlette.requests import Request
+    return Request({
+        "type": "http", "method": "GET", "path": path, "root_path": "", "scheme": "http",
+        "query_string": b"", "headers": [], "server": ("bench", 80)
+    })
+
+def build_cases(year: int, month: int, day):
+    from app.database import get_monthly_purchases, get_daily_purchases, get_monthly_summary
+    from app.routers.summary import summary_page, generate_calendar_data
+    from app.reports import generate_monthly_pdf
+
+    daily = {}
+
+    async def prepare_calendar():
+        daily.update((await get_monthly_summary(year, month))["daily"])
+
+    async def calendar():
+        generate_calendar_data(year, month, daily)
+
+    return [
+        ("get_monthly_purchases", None, lambda: get_monthly_purchases(year, month)),
+        ("get_daily_purchases", None, lambda: get_daily_purchases(day)),
+        ("summary_page", None, lambda: summary_page(make_request("/summary/"), f"{month}-{year}")),
+        ("generate_calendar_data", prepare_calendar, calendar),
+        ("generate_monthly_pdf", None, lambda: generate_monthly_pdf(year, month)),
+    ]
+
+async def measure(run, repeat: int):
+    timings = []
+    trips = []
+    for _ in range(repeat):
+        clear_caches()
+        before = round_trips.count
+        started = time.perf_counter()
+        await run()
+        timings.append((time.perf_counter() - started) * 1000)
+        trips.append(round_trips.count - before)
+
+    # Allocations are measured on a separate run so tracing does not skew the timings
+    clear_caches()
+    tracemalloc.start()
+    await run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "peak_kib": round(peak / 1024, 1),
+        "round_trips": max(trips)
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        # Timings and allocations get some slack; any extra round trip is a regression
+        limits = {
+            "median_ms": previous["median_ms"] * (1 + tolerance),
+            "peak_kib": previous["peak_kib"] * (1 + tolerance),
+            "round_trips": previous["round_trips"]
+        }
+        for metric, limit in limits.items():
+            if result[metric] > limit:
+                regressions.append(f"{name}.{metric}: {result[metric]} > baseline {previous[metric]}")
+    return regressions
+
+async def run_benchmarks(args):
+    from app.database import get_database, get_available_months
+    from app.reports import shutdown_pdf_executor
+    from synthetic_data import seed_database, DatabaseNotEmpty
+
+    backend = await connect(args.url)
+    started = time.perf_counter()
+    try:
+        count = await seed_database(
+            get_database(), args.people, args.years, args.daily_share, args.legacy_share, args.seed,
+            force=args.force
+        )
+    except DatabaseNotEmpty as e:
+        sys.exit(str(e))
+    print(f"Seeded {count} purchases for {args.people} people over {args.years} years "
+          f"({args.legacy_share:.0%} legacy) in {time.perf_counter() - started:.1f}s [{backend}]")
+
+    # Benchmark the most recent full month
+    months = await get_available_months()
+    latest_full = months[1] if len(months) > 1 else months[0]
+    year, month = latest_full["year"], latest_full["month"]
+    day = datetime(year, month, 15)
+
+    results = {}
+    print(f"{'function':<24} {'median ms':>10} {'p95 ms':>10} {'peak KiB':>10} {'round trips':>12}")
+    try:
+        for name, prepare, run in build_cases(year, month, day):
+            if prepare:
+                await prepare()
+            # Warm-up loads the people directory, the milk rate and the PDF worker pool
+            await run()
+            results[name] = await measure(run, args.repeat)
+            result = results[name]
+            trips = result["round_trips"] if backend == "mongod" else "-"
+            print(f"{name:<24} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+                  f"{result['peak_kib']:>10.1f} {trips:>12}")
+    finally:
+        shutdown_pdf_executor()
+    return backend, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="MongoDB URL of a throwaway database")
+    parser.add_argument("--database", help="Database to seed; required with --url")
+    parser.add_argument("--force", action="store_true", help="Replace existing people and purchases")
+    parser.add_argument("--mongod", action="store_true", help="Start a temporary local mongod")
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--daily-share", type=float, default=0.3)
+    parser.add_argument("--legacy-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--save", action="store_true", help="Save results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing")
+    args = parser.parse_args()
+    # An exported DATABASE_NAME must never decide which database gets wiped
+    if args.url and not args.database:
+        parser.error("--database is required with --url")
+    os.environ["DATABASE_NAME"] = args.database or "milk_bench"
+
+    mongod = None
+    if args.mongod:
+        process, dbpath, args.url = start_mongod()
+        mongod = (process, dbpath)
+    try:
+        backend, results = asyncio.run(run_benchmarks(args))
+    finally:
+        if mongod:
+            stop_mongod(*mongod)
+
+    baseline_path = os.path.join(BASELINE_DIR, f"data_layer_{backend}.json")
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, "w") as baseline_file:
+            json.dump({"params": vars(args) | {"url": None}, "results": results}, baseline_file, indent=2)
+        print(f"Baseline saved to {os.path.relpath(baseline_path, ROOT)}")
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            sys.exit(f"No baseline at {os.path.relpath(baseline_path, ROOT)}; run with --save first")
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compare building Pydantic Purchase models against PurchaseRow for a large month
+Usage: python benchmarks/bench_purchase_rows.py [rows]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Purchase, PurchaseRow
+
+def make_documents(count: int):
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "date": start + timedelta(minutes=i),
+            "person": f"Person {i % 50}",
+            "quantity": 1.5,
+            "price_per_liter": 60.0,
+            "total_cost": 90.0
+        }
+        for i in range(count)
+    ]
+
+def measure(label: str, build, documents: list):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = [build(document) for document in documents]
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_row_us = elapsed / len(rows) * 1e6
+    print(f"{label:<14} {elapsed * 1000:8.1f} ms  {per_row_us:6.2f} us/row  peak {peak / 1024:8.0f} KiB")
+    return elapsed, peak
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    documents = make_documents(count)
+    print(f"Building {count} purchase rows")
+    model_time, model_peak = measure("Purchase", lambda d: Purchase(**d), documents)
+    row_time, row_peak = measure("PurchaseRow", PurchaseRow.from_document, documents)
+    print(f"PurchaseRow is {model_time / row_time:.1f}x faster and uses {model_peak / row_peak:.1f}x less memory")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measure cold-start import cost of the app and guard the startup budget
+Usage: python benchmarks/bench_startup.py [budget_ms]
+Fails if importing main pulls in ReportLab or NumPy or exceeds the budget (STARTUP_BUDGET_MS, default 1500)
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("reportlab", "numpy")
+
+def import_times():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(result.returncode)
+    
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+    times = import_times()
+    total_ms = times.get("main", 0) / 1000
+    
+    print(f"import main: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    print("Slowest top-level imports:")
+    top_level = {name: us for name, us in times.items() if "." not in name and name != "main"}
+    for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:10]:
+        print(f"  {name:<24} {us / 1000:8.1f} ms")
+    
+    failed = False
+    for module in LAZY_MODULES:
+        if module in times:
+            print(f"FAIL: {module} is imported at startup; it should load on first use")
+            failed = True
+    if total_ms > budget_ms:
+        print(f"FAIL: startup import time {total_ms:.1f} ms exceeds budget {budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
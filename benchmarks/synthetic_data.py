@@ -0,0 +1,136 @@
+"""
+Seeded synthetic purchase history for benchmarks
+Importable, or run directly to fill a scratch database:
+    python benchmarks/synthetic_data.py --database milk_bench [--url mongodb://localhost:27017 --years 3 --people 200]
+Refuses to touch a database that already has people or purchases unless --force is passed
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import PURCHASE_SCHEMA_VERSION, _apply_purchase_deltas
+
+PRICE_PER_LITER = 60.0
+
+class DatabaseNotEmpty(RuntimeError):
+    pass
+
+def generate_people(count: int):
+    return [{"name": f"Person {i:04d}", "email": f"person{i:04d}@example.com"} for i in range(count)]
+
+def generate_purchases(
+    people: list,
+    years: int = 3,
+    daily_share: float = 0.3,
+    legacy_share: float = 0.1,
+    seed: int = 42,
+    end_date: datetime = None
+):
+    """Yield purchase documents day by day; a legacy_share of buying days uses the old `people` array schema"""
+    rng = random.Random(seed)
+    names = [person["name"] for person in people]
+    end_date = (end_date or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    day = end_date - timedelta(days=365 * years)
+    while day < end_date:
+        buyers = [name for name in names if rng.random() < daily_share]
+        while buyers:
+            moment = day + timedelta(hours=rng.randint(5, 21), minutes=rng.randint(0, 59))
+            quantity = rng.choice((0.5, 1.0, 1.5, 2.0))
+            if len(buyers) > 1 and rng.random() < legacy_share:
+                size = rng.randint(2, min(4, len(buyers)))
+                group, buyers = buyers[:size], buyers[size:]
+                total_cost = quantity * PRICE_PER_LITER
+                yield {
+                    "date": moment,
+                    "people": group,
+                    "quantity": quantity,
+                    "price_per_liter": PRICE_PER_LITER,
+                    "total_cost": total_cost,
+                    "cost_per_person": total_cost / len(group)
+                }
+            else:
+                person, buyers = buyers[0], buyers[1:]
+                yield {
+                    "date": moment,
+                    "person": person,
+                    "quantity": quantity,
+                    "price_per_liter": PRICE_PER_LITER,
+                    "total_cost": quantity * PRICE_PER_LITER,
+                    "schema_version": PURCHASE_SCHEMA_VERSION
+                }
+        day += timedelta(days=1)
+
+async def seed_database(
+    database,
+    people: int = 200,
+    years: int = 3,
+    daily_share: float = 0.3,
+    legacy_share: float = 0.1,
+    seed: int = 42,
+    batch_size: int = 5000,
+    force: bool = False
+):
+    """Replace the purchase data in `database` with a synthetic history and build its rollups"""
+    # Never wipe real data by accident: an exported DATABASE_NAME or a stray --url must not be enough
+    if not force and (await database.people.find_one() or await database.purchases.find_one()):
+        raise DatabaseNotEmpty(
+            f"Database '{database.name}' already has people or purchases; pass --force to replace them"
+        )
+    for collection in ("people", "purchases", "purchase_rollups", "purchase_months", "payment_status", "settings"):
+        await database[collection].delete_many({})
+
+    directory = generate_people(people)
+    await database.people.insert_many([dict(person) for person in directory])
+    await database.settings.insert_one({"milk_rate": PRICE_PER_LITER, "updated_at": datetime.now()})
+
+    count = 0
+    batch = []
+    for purchase in generate_purchases(directory, years, daily_share, legacy_share, seed):
+        batch.append(purchase)
+        if len(batch) >= batch_size:
+            await database.purchases.insert_many(batch)
+            await _apply_purchase_deltas(batch, 1)
+            count += len(batch)
+            batch = []
+    if batch:
+        await database.purchases.insert_many(batch)
+        await _apply_purchase_deltas(batch, 1)
+        count += len(batch)
+    return count
+
+async def main():
+    from app.database import connect_to_mongo, close_mongo_connection, get_database
+
+    parser = argparse.ArgumentParser(description="Fill a scratch database with synthetic purchases")
+    # Deliberately no .env: the target must be named on the command line
+    parser.add_argument("--database", required=True, help="Database to fill")
+    parser.add_argument("--url", default="mongodb://localhost:27017", help="MongoDB URL")
+    parser.add_argument("--force", action="store_true", help="Replace existing people and purchases")
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--daily-share", type=float, default=0.3)
+    parser.add_argument("--legacy-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ["MONGODB_URL"] = args.url
+    os.environ["DATABASE_NAME"] = args.database
+    await connect_to_mongo()
+    try:
+        count = await seed_database(
+            get_database(), args.people, args.years, args.daily_share, args.legacy_share, args.seed,
+            force=args.force
+        )
+    except DatabaseNotEmpty as e:
+        sys.exit(str(e))
+    finally:
+        await close_mongo_connection()
+    print(f"Inserted {count} purchases for {args.people} people into {args.database}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""
+Explain every hot query in app/database.py and fail if any falls back to a collection scan
+Usage: python check_indexes.py
+"""
+import asyncio
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import connect_to_mongo, close_mongo_connection
+from app.indexes import ensure_indexes, explain_hot_queries
+
+async def check_indexes():
+    await connect_to_mongo()
+    await ensure_indexes()
+    failures = 0
+    for name, collection, stages in await explain_hot_queries():
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        if status != "ok":
+            failures += 1
+        print(f"{status:<9} {name:<24} {collection:<18} {' <- '.join(stages)}")
+    await close_mongo_connection()
+    return failures
+
+if __name__ == "__main__":
+    failures = asyncio.run(check_indexes())
+    if failures:
+        print(f"{failures} hot queries scan the whole collection")
+        sys.exit(1)
+    print("All hot queries use an index")
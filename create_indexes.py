@@ -1,29 +1,21 @@
 """
-Run this script once to create database indexes for better performance
+Create the database indexes declared in app/indexes.py
+The app also ensures them on startup; run this to apply them ahead of a deploy
 Usage: python create_indexes.py
 """
 import asyncio
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.database import connect_to_mongo, close_mongo_connection
+from app.indexes import ensure_indexes
+
 async def create_indexes():
-    client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
-    db = client[os.getenv("DATABASE_NAME")]
-    
-    # Create index on purchases.date for faster date-based queries
-    await db.purchases.create_index([("date", -1)])
-    
-    # Create compound index for date range queries
-    await db.purchases.create_index([("date", -1), ("person", 1)])
-    
-    # Create index on people collection
-    await db.people.create_index([("name", 1)])
-    
-    print("Database indexes created successfully")
-    client.close()
+    await connect_to_mongo()
+    created = await ensure_indexes()
+    print(f"Database indexes created successfully ({created} new)")
+    await close_mongo_connection()
 
 if __name__ == "__main__":
     asyncio.run(create_indexes())
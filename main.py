@@ -1,29 +1,68 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.database import connect_to_mongo, close_mongo_connection
-from app.routers import purchases, people, summary
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from app.email_service import send_monthly_summary
-
-scheduler = AsyncIOScheduler()
+from app.database import (
+    connect_to_mongo, close_mongo_connection, refresh_data_versions, watch_data_versions,
+    materialize_upcoming_standing_orders, compact_change_log
+)
+from app.routers import purchases, people, summary, standing_orders, api, metrics, admin, sync
+from app.scheduler import scheduler, singleton_job
+from app.email_service import send_monthly_summary, retry_failed_emails
+from app.reports import shutdown_pdf_executor
+from app.migrations import run_startup_migrations
+from app.indexes import ensure_indexes
+from app.metrics import MetricsMiddleware
+from app.static_config import setup_static_files
+from app.profiler import PROFILER_ENABLED, RouteContextMiddleware, start_profiler
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    # Existing indexes are skipped, so this only does work on a fresh or outdated database
+    await ensure_indexes()
+    # Keep this worker's caches in step with writes made by other workers
+    await refresh_data_versions()
+    cache_sync_task = asyncio.create_task(watch_data_versions())
+    # Rewrite legacy purchases in the background without delaying startup
+    migration_task = asyncio.create_task(run_startup_migrations())
+    # Explains slow commands in the background when SLOW_QUERY_PROFILER is on
+    profiler_task = start_profiler()
     scheduler.start()
+    # Every worker registers the jobs; a MongoDB lease makes sure each slot runs once
     # Schedule monthly email on 1st of every month at 9 AM
-    scheduler.add_job(send_monthly_summary, 'cron', day=1, hour=9, minute=0)
+    scheduler.add_job(
+        singleton_job("send_monthly_summary", send_monthly_summary, "%Y-%m"),
+        'cron', day=1, hour=9, minute=0
+    )
+    # Generate the coming week's standing-order deliveries every night
+    scheduler.add_job(
+        singleton_job("materialize_standing_orders", materialize_upcoming_standing_orders, "%Y-%m-%d"),
+        'cron', hour=0, minute=5
+    )
+    # Retry queued emails that failed to send
+    scheduler.add_job(
+        singleton_job("retry_failed_emails", retry_failed_emails, "%Y-%m-%d %H:%M"),
+        'cron', minute='*/15'
+    )
+    # Collapse and expire the offline-sync change log overnight
+    scheduler.add_job(
+        singleton_job("compact_change_log", compact_change_log, "%Y-%m-%d"),
+        'cron', hour=3, minute=30
+    )
     yield
     # Shutdown
+    migration_task.cancel()
+    if profiler_task:
+        profiler_task.cancel()
+    cache_sync_task.cancel()
     scheduler.shutdown()
+    shutdown_pdf_executor()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -44,16 +83,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Per-route latency histograms, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+if PROFILER_ENABLED:
+    app.add_middleware(RouteContextMiddleware)
 
-# Templates
-templates = Jinja2Templates(directory="app/templates")
+# Static files: fingerprinted, precompressed builds are cached forever
+setup_static_files(app)
 
 # Include routers
 app.include_router(purchases.router)
 app.include_router(people.router, prefix="/people")
 app.include_router(summary.router, prefix="/summary")
+app.include_router(standing_orders.router, prefix="/standing-orders")
+app.include_router(api.router, prefix="/api/v1")
+app.include_router(metrics.router)
+app.include_router(admin.router, prefix="/admin")
+app.include_router(sync.router)
 
 if __name__ == "__main__":
     import uvicorn
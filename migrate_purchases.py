@@ -0,0 +1,23 @@
+"""
+Rewrite legacy purchases that store a `people` array into one document per person
+Safe to run while the app is up and to re-run after an interruption
+Usage: python migrate_purchases.py
+"""
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import connect_to_mongo, close_mongo_connection
+from app.migrations import migrate_legacy_purchases
+
+async def main():
+    await connect_to_mongo()
+    try:
+        migrated = await migrate_legacy_purchases()
+        print(f"Migrated {migrated} legacy purchases")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
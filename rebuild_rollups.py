@@ -0,0 +1,22 @@
+"""
+Recompute the purchase_rollups collection and the month catalogue from the raw purchases
+Run this after importing data directly into MongoDB or if the rollups drift
+Usage: python rebuild_rollups.py
+"""
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import connect_to_mongo, close_mongo_connection, rebuild_rollups
+
+async def main():
+    await connect_to_mongo()
+    try:
+        count = await rebuild_rollups()
+        print(f"Rebuilt {count} rollup entries")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())